@@ -0,0 +1,157 @@
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from typing import Hashable, NamedTuple
+
+from fastapi import Request, Response, status
+
+from .config import get_settings
+
+settings = get_settings()
+
+type CacheKey = tuple[Hashable, ...]
+
+
+class TTLCache[V]:
+    """Bounded in-process LRU cache whose entries also expire after ``ttl``.
+
+    Keys are tuples whose first element is a namespace (e.g. ``"product"``),
+    so related entries can be dropped together with ``invalidate_namespace``.
+    Given ``weigh``, the cache also keeps the total weight of its values
+    (e.g. their size in bytes) within ``max_bytes``.
+
+    A reader that misses takes the namespace's ``generation`` before
+    querying and passes it to ``set``; if an invalidation came in meanwhile,
+    the value it read may predate the write and is not stored.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        max_bytes: int | None = None,
+        weigh: Callable[[V], int] | None = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.weigh = weigh
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: OrderedDict[CacheKey, tuple[float, V]] = OrderedDict()
+        self._generation = 0
+        self._generations: dict[Hashable, int] = {}
+        self._cleared_at = 0
+
+    def _size(self, value: V) -> int:
+        return self.weigh(value) if self.weigh is not None else 0
+
+    def get(self, key: CacheKey) -> V | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def generation(self, namespace: Hashable) -> int:
+        return max(self._generations.get(namespace, 0), self._cleared_at)
+
+    def set(
+        self, key: CacheKey, value: V, generation: int | None = None
+    ) -> None:
+        if generation is not None and generation != self.generation(key[0]):
+            return
+        self._pop(key)
+        size = self._size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self.bytes += size
+        while len(self._entries) > self.max_size or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= self._size(evicted)
+
+    def invalidate(self, key: CacheKey) -> None:
+        self._bump(key[0])
+        self._pop(key)
+
+    def invalidate_namespace(self, namespace: str) -> None:
+        self._bump(namespace)
+        for key in [k for k in self._entries if k[0] == namespace]:
+            self._pop(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._cleared_at = self._generation
+        self._entries.clear()
+        self.bytes = 0
+
+    def _bump(self, namespace: Hashable) -> None:
+        self._generation += 1
+        self._generations[namespace] = self._generation
+
+    def _pop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self._size(entry[1])
+
+    def stats(self) -> dict[str, int | None]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedResponse":
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        return cls(body=body, etag=f'"{digest}"')
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def conditional_response(
+    request: Request,
+    cached: CachedResponse,
+    headers: Mapping[str, str] | None = None,
+) -> Response:
+    """Build a JSON response, or a bodiless 304 if the client's tag matches."""
+    headers = {**(headers or {}), "ETag": cached.etag}
+    if if_none_match(request, cached.etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    return Response(
+        content=cached.body, media_type="application/json", headers=headers
+    )
+
+
+catalog_cache: TTLCache[CachedResponse] = TTLCache(
+    max_size=settings.catalog_cache_max_size,
+    ttl=settings.catalog_cache_ttl,
+    max_bytes=settings.catalog_cache_max_bytes,
+    weigh=lambda cached: len(cached.body),
+)
@@ -0,0 +1,22 @@
+from typing import Annotated
+
+from fastapi import Depends, Request
+
+from app.cart_store.base import CartStore
+from app.cart_store.kv import KeyValueCartStore
+from app.cart_store.sql import SqlCartStore
+from app.config import get_settings
+from app.db import SessionDep
+
+settings = get_settings()
+
+
+def get_cart_store(request: Request, session: SessionDep) -> CartStore:
+    if settings.cart_store == "sql":
+        return SqlCartStore(session)
+    return KeyValueCartStore(
+        request.app.state.key_value_client, settings.cart_ttl, session
+    )
+
+
+CartStoreDep = Annotated[CartStore, Depends(get_cart_store)]
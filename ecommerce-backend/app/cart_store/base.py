@@ -0,0 +1,137 @@
+import abc
+import dataclasses
+import datetime
+import decimal
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Cart
+
+
+@dataclasses.dataclass
+class StoredCart:
+    id: int
+    user_id: uuid.UUID | None
+    items: dict[str, int]
+    created_at: datetime.datetime
+    is_active: bool = True
+    version: int = 1
+
+    @classmethod
+    def from_model(cls, cart: Cart) -> "StoredCart":
+        return cls(
+            id=cart.id,
+            user_id=cart.user_id,
+            items=dict(cart.items),
+            created_at=cart.created_at,
+            is_active=cart.is_active,
+            version=cart.version,
+        )
+
+
+@dataclasses.dataclass
+class CartTotals:
+    total_items_count: int
+    subtotal: decimal.Decimal
+
+
+@dataclasses.dataclass
+class ItemChange:
+    """New quantity ``coalesce(absolute, current) + delta``; zero drops it."""
+
+    absolute: int | None = None
+    delta: int = 0
+    max_quantity: int = 0
+
+    def apply(self, current: int) -> int:
+        base = self.absolute if self.absolute is not None else current
+        return base + self.delta
+
+
+class CartStore(abc.ABC):
+    """Active carts; mutations return ``None`` if they do not apply."""
+
+    @abc.abstractmethod
+    async def create(
+        self, items: dict[str, int], user_id: uuid.UUID | None = None
+    ) -> StoredCart: ...
+
+    @abc.abstractmethod
+    async def get(self, cart_id: int) -> StoredCart | None: ...
+
+    @abc.abstractmethod
+    async def merge_items(
+        self, cart_id: int, items: dict[str, int], version: int | None = None
+    ) -> StoredCart | None:
+        """Set the quantities of ``items``, keeping the other items."""
+
+    @abc.abstractmethod
+    async def add_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        max_quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        """Add ``quantity`` unless the total would exceed ``max_quantity``."""
+
+    @abc.abstractmethod
+    async def set_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        """Set the quantity of an item already in the cart."""
+
+    @abc.abstractmethod
+    async def remove_item(
+        self, cart_id: int, product_id: str, version: int | None = None
+    ) -> StoredCart | None: ...
+
+    @abc.abstractmethod
+    async def apply_changes(
+        self,
+        cart_id: int,
+        changes: dict[str, ItemChange],
+        version: int | None = None,
+    ) -> StoredCart | None:
+        """Apply all ``changes`` or, if any exceeds its maximum, none."""
+
+    @abc.abstractmethod
+    async def merge_into_user(
+        self, cart_id: int, user_id: uuid.UUID
+    ) -> StoredCart | None:
+        """Attach the anonymous cart to the user, merging into their cart."""
+
+    @abc.abstractmethod
+    async def check_out(self, session: AsyncSession, cart: StoredCart) -> bool:
+        """Mark ``cart`` checked out; ``False`` if it changed meanwhile."""
+
+    async def release(self, cart_id: int) -> None:
+        """Drop a checked-out cart once its transaction has committed."""
+
+    async def get_totals(
+        self, session: AsyncSession, cart_id: int
+    ) -> CartTotals | None:
+        """Item count and subtotal of the cart's existing products."""
+        cart = await self.get(cart_id)
+        if cart is None or not cart.is_active:
+            return None
+        result = await session.execute(
+            text(
+                "SELECT coalesce(sum(i.quantity), 0), "
+                "coalesce(sum(p.price * i.quantity), 0) "
+                "FROM unnest(CAST(:product_ids AS uuid[]), "
+                "CAST(:quantities AS integer[])) AS i(product_id, quantity) "
+                "JOIN products p ON p.id = i.product_id"
+            ).bindparams(
+                product_ids=list(cart.items),
+                quantities=list(cart.items.values()),
+            )
+        )
+        return CartTotals(*result.one())
@@ -0,0 +1,364 @@
+import datetime
+import time
+import uuid
+from typing import Any, Protocol
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cart_store.base import CartStore, ItemChange, StoredCart
+from app.cart_store.sql import SqlCartStore
+from app.config import get_settings
+from app.db import Cart
+
+settings = get_settings()
+
+
+class KeyValueClient(Protocol):
+    """The Redis commands used by ``KeyValueCartStore``."""
+
+    async def exists(self, *keys: str) -> int: ...
+
+    async def expire(self, key: str, seconds: int) -> bool: ...
+
+    async def delete(self, *keys: str) -> int: ...
+
+    async def hgetall(self, key: str) -> dict[str, str]: ...
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> int: ...
+
+    async def hincrby(self, key: str, field: str, amount: int) -> int: ...
+
+    async def hexists(self, key: str, field: str) -> bool: ...
+
+    async def hdel(self, key: str, *fields: str) -> int: ...
+
+    async def aclose(self) -> None: ...
+
+
+class InMemoryKeyValue:
+    """Single-process ``KeyValueClient`` for tests and local development."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        self._expires: dict[str, float] = {}
+
+    def _live(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return key in self._data
+
+    def _hash(self, key: str) -> dict[str, str]:
+        if not self._live(key):
+            self._data[key] = {}
+        return self._data[key]
+
+    async def exists(self, *keys: str) -> int:
+        return sum(self._live(key) for key in keys)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if not self._live(key):
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            deleted += self._live(key)
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return deleted
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self._data[key]) if self._live(key) else {}
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> int:
+        fields = self._hash(key)
+        added = len(mapping.keys() - fields.keys())
+        fields.update({k: str(v) for k, v in mapping.items()})
+        return added
+
+    async def hincrby(self, key: str, field: str, amount: int) -> int:
+        fields = self._hash(key)
+        value = int(fields.get(field, 0)) + amount
+        fields[field] = str(value)
+        return value
+
+    async def hexists(self, key: str, field: str) -> bool:
+        return self._live(key) and field in self._data[key]
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        if not self._live(key):
+            return 0
+        values = self._data[key]
+        deleted = sum(values.pop(field, None) is not None for field in fields)
+        if not values:
+            await self.delete(key)
+        return deleted
+
+    async def aclose(self) -> None:
+        pass
+
+
+class KeyValueCartStore(CartStore):
+    """Anonymous carts in a key-value store, moved to SQL on attach."""
+
+    def __init__(
+        self, client: KeyValueClient, ttl: int, session: AsyncSession
+    ) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.session = session
+        self.sql = SqlCartStore(session)
+
+    @staticmethod
+    def _keys(cart_id: int) -> tuple[str, str]:
+        return f"cart:{cart_id}", f"cart:{cart_id}:items"
+
+    async def _is_local(self, cart_id: int) -> bool:
+        meta_key, _ = self._keys(cart_id)
+        return bool(await self.client.exists(meta_key))
+
+    async def _touch(self, cart_id: int) -> None:
+        for key in self._keys(cart_id):
+            await self.client.expire(key, self.ttl)
+
+    async def _claim(self, cart_id: int, version: int | None) -> bool:
+        """Bump the cart's version if it is still ``version``."""
+        meta_key, _ = self._keys(cart_id)
+        meta = await self.client.hgetall(meta_key)
+        if not meta:
+            return False
+        if version is not None and int(meta["version"]) != version:
+            return False
+        bumped = await self.client.hincrby(meta_key, "version", 1)
+        return version is None or bumped == version + 1
+
+    @staticmethod
+    async def _persist(
+        session: AsyncSession,
+        cart: StoredCart,
+        user_id: uuid.UUID | None,
+        is_active: bool,
+    ) -> bool:
+        """Insert ``cart`` under its own id; ``False`` if already there."""
+        result = await session.execute(
+            insert(Cart)
+            .values(
+                id=cart.id,
+                user_id=user_id,
+                items=cart.items,
+                created_at=cart.created_at,
+                is_active=is_active,
+                version=cart.version,
+            )
+            .on_conflict_do_nothing(index_elements=[Cart.id])
+        )
+        return result.rowcount == 1
+
+    async def create(
+        self, items: dict[str, int], user_id: uuid.UUID | None = None
+    ) -> StoredCart:
+        if user_id is not None:
+            return await self.sql.create(items, user_id)
+        result = await self.session.execute(
+            text("SELECT nextval(pg_get_serial_sequence('carts', 'id'))")
+        )
+        cart_id = result.scalar_one()
+        meta_key, items_key = self._keys(cart_id)
+        # ``carts.created_at`` is a naive UTC timestamp.
+        created_at = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        await self.client.hset(
+            meta_key,
+            mapping={"created_at": created_at.isoformat(), "version": 1},
+        )
+        if items:
+            await self.client.hset(items_key, mapping=items)
+        await self._touch(cart_id)
+        return StoredCart(
+            id=cart_id, user_id=None, items=items, created_at=created_at
+        )
+
+    async def get(self, cart_id: int) -> StoredCart | None:
+        meta_key, items_key = self._keys(cart_id)
+        meta = await self.client.hgetall(meta_key)
+        if not meta:
+            return await self.sql.get(cart_id)
+        items = await self.client.hgetall(items_key)
+        return StoredCart(
+            id=cart_id,
+            user_id=None,
+            items={pid: int(quantity) for pid, quantity in items.items()},
+            created_at=datetime.datetime.fromisoformat(meta["created_at"]),
+            version=int(meta["version"]),
+        )
+
+    async def merge_items(
+        self, cart_id: int, items: dict[str, int], version: int | None = None
+    ) -> StoredCart | None:
+        if not await self._is_local(cart_id):
+            return await self.sql.merge_items(cart_id, items, version)
+        _, items_key = self._keys(cart_id)
+        if not await self._claim(cart_id, version):
+            return None
+        if items:
+            await self.client.hset(items_key, mapping=items)
+        await self._touch(cart_id)
+        return await self.get(cart_id)
+
+    async def add_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        max_quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        if not await self._is_local(cart_id):
+            return await self.sql.add_item(
+                cart_id, product_id, quantity, max_quantity, version
+            )
+        _, items_key = self._keys(cart_id)
+        total = await self.client.hincrby(items_key, product_id, quantity)
+        # Undo instead of check-then-set, which would race.
+        if total > max_quantity or not await self._claim(cart_id, version):
+            await self._undo(items_key, [(product_id, quantity)])
+            return None
+        await self._touch(cart_id)
+        return await self.get(cart_id)
+
+    async def set_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        if not await self._is_local(cart_id):
+            return await self.sql.set_item(
+                cart_id, product_id, quantity, version
+            )
+        _, items_key = self._keys(cart_id)
+        if not await self.client.hexists(items_key, product_id):
+            return None
+        if not await self._claim(cart_id, version):
+            return None
+        await self.client.hset(items_key, mapping={product_id: quantity})
+        await self._touch(cart_id)
+        return await self.get(cart_id)
+
+    async def remove_item(
+        self, cart_id: int, product_id: str, version: int | None = None
+    ) -> StoredCart | None:
+        if not await self._is_local(cart_id):
+            return await self.sql.remove_item(cart_id, product_id, version)
+        _, items_key = self._keys(cart_id)
+        if not await self._claim(cart_id, version):
+            return None
+        await self.client.hdel(items_key, product_id)
+        await self._touch(cart_id)
+        return await self.get(cart_id)
+
+    async def apply_changes(
+        self,
+        cart_id: int,
+        changes: dict[str, ItemChange],
+        version: int | None = None,
+    ) -> StoredCart | None:
+        if not await self._is_local(cart_id):
+            return await self.sql.apply_changes(cart_id, changes, version)
+        _, items_key = self._keys(cart_id)
+        absolute = {
+            product_id: change
+            for product_id, change in changes.items()
+            if change.absolute is not None
+        }
+        if any(c.apply(0) > c.max_quantity for c in absolute.values()):
+            return None
+        # HINCRBY each delta, undoing them if one overshoots.
+        applied: list[tuple[str, int]] = []
+        for product_id, change in changes.items():
+            if product_id in absolute:
+                continue
+            total = await self.client.hincrby(
+                items_key, product_id, change.delta
+            )
+            applied.append((product_id, change.delta))
+            if total > change.max_quantity:
+                await self._undo(items_key, applied)
+                return None
+        if not await self._claim(cart_id, version):
+            await self._undo(items_key, applied)
+            return None
+        quantities = {pid: c.apply(0) for pid, c in absolute.items()}
+        if quantities:
+            await self.client.hset(items_key, mapping=quantities)
+        await self._drop_empty(items_key, list(changes))
+        await self._touch(cart_id)
+        return await self.get(cart_id)
+
+    async def _undo(
+        self, items_key: str, applied: list[tuple[str, int]]
+    ) -> None:
+        for product_id, delta in applied:
+            await self.client.hincrby(items_key, product_id, -delta)
+        await self._drop_empty(items_key, [pid for pid, _ in applied])
+
+    async def merge_into_user(
+        self, cart_id: int, user_id: uuid.UUID
+    ) -> StoredCart | None:
+        # Copied to PostgreSQL and merged there like any other cart.
+        if not await self._is_local(cart_id):
+            return await self.sql.merge_into_user(cart_id, user_id)
+        cart = await self.get(cart_id)
+        if cart is None or not await self._claim(cart_id, cart.version):
+            return None
+        if not await self._persist(self.session, cart, None, is_active=True):
+            return None
+        merged = await self.sql.merge_into_user(cart_id, user_id)
+        if merged is None:
+            await self.session.rollback()
+            return None
+        await self.release(cart_id)
+        return merged
+
+    async def _drop_empty(self, items_key: str, product_ids: list[str]) -> None:
+        items = await self.client.hgetall(items_key)
+        empty = [pid for pid in product_ids if int(items.get(pid, 0)) <= 0]
+        if empty:
+            await self.client.hdel(items_key, *empty)
+
+    async def check_out(self, session: AsyncSession, cart: StoredCart) -> bool:
+        if not await self._is_local(cart.id):
+            return await self.sql.check_out(session, cart)
+        if not await self._claim(cart.id, cart.version):
+            return False
+        return await self._persist(session, cart, cart.user_id, is_active=False)
+
+    async def release(self, cart_id: int) -> None:
+        await self.client.delete(*self._keys(cart_id))
+
+
+def create_key_value_client() -> KeyValueClient | None:
+    """The client for ``settings.cart_store``, or ``None`` for ``sql``."""
+    if settings.cart_store == "sql":
+        return None
+    if settings.cart_store == "memory":
+        if settings.web_concurrency > 1:
+            raise RuntimeError(
+                "cart_store=memory cannot be shared between "
+                f"{settings.web_concurrency} workers; use cart_store=redis"
+            )
+        return InMemoryKeyValue()
+    try:
+        from redis import asyncio as redis
+    except ImportError as exc:
+        raise RuntimeError(
+            "cart_store=redis requires the redis extra: "
+            "pip install 'ecommerce-backend[redis]'"
+        ) from exc
+    return redis.from_url(settings.cart_store_url, decode_responses=True)
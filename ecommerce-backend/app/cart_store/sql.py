@@ -0,0 +1,253 @@
+import uuid
+from typing import Any
+
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Text,
+    func,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cart_store.base import CartStore, CartTotals, ItemChange, StoredCart
+from app.db import Cart
+
+
+class SqlCartStore(CartStore):
+    """Keeps carts in the ``carts`` table; every mutation commits."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def create(
+        self, items: dict[str, int], user_id: uuid.UUID | None = None
+    ) -> StoredCart:
+        cart = Cart(user_id=user_id, items=items)
+        self.session.add(cart)
+        await self.session.commit()
+        await self.session.refresh(cart)
+        return StoredCart.from_model(cart)
+
+    async def get(self, cart_id: int) -> StoredCart | None:
+        cart = await self.session.get(Cart, cart_id)
+        if cart is None or not cart.is_active:
+            return None
+        return StoredCart.from_model(cart)
+
+    async def merge_items(
+        self, cart_id: int, items: dict[str, int], version: int | None = None
+    ) -> StoredCart | None:
+        return await self._update_items(
+            cart_id, version, Cart.items.op("||")(literal(items, JSONB))
+        )
+
+    async def add_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        max_quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        new_quantity = (
+            func.coalesce(Cart.items[product_id].astext.cast(Integer), 0)
+            + quantity
+        )
+        return await self._update_items(
+            cart_id,
+            version,
+            func.jsonb_set(
+                Cart.items,
+                array([product_id], type_=Text),
+                func.to_jsonb(new_quantity),
+            ),
+            new_quantity <= max_quantity,
+        )
+
+    async def set_item(
+        self,
+        cart_id: int,
+        product_id: str,
+        quantity: int,
+        version: int | None = None,
+    ) -> StoredCart | None:
+        return await self._update_items(
+            cart_id,
+            version,
+            func.jsonb_set(
+                Cart.items,
+                array([product_id], type_=Text),
+                func.to_jsonb(quantity),
+            ),
+            Cart.items.has_key(product_id),
+        )
+
+    async def remove_item(
+        self, cart_id: int, product_id: str, version: int | None = None
+    ) -> StoredCart | None:
+        return await self._update_items(
+            cart_id, version, Cart.items.op("-")(product_id)
+        )
+
+    async def apply_changes(
+        self,
+        cart_id: int,
+        changes: dict[str, ItemChange],
+        version: int | None = None,
+    ) -> StoredCart | None:
+        # Quantities are computed from the row being updated, so concurrent
+        # changes are never lost.
+        statement = text(
+            "WITH changes AS ("
+            "SELECT * FROM unnest(CAST(:product_ids AS text[]), "
+            "CAST(:absolutes AS integer[]), CAST(:deltas AS integer[]), "
+            "CAST(:max_quantities AS integer[])) "
+            "AS c(product_id, absolute, delta, max_quantity)) "
+            "UPDATE carts SET version = carts.version + 1, "
+            "last_activity_at = now(), items = ("
+            "SELECT coalesce(jsonb_object_agg(m.key, m.value), '{}') FROM ("
+            "SELECT e.key, e.value FROM jsonb_each(carts.items) e "
+            "WHERE e.key NOT IN (SELECT product_id FROM changes) "
+            "UNION ALL "
+            "SELECT c.product_id, to_jsonb(q.quantity) FROM changes c "
+            "CROSS JOIN LATERAL (SELECT coalesce(c.absolute, "
+            "(carts.items ->> c.product_id)::integer, 0) + c.delta "
+            "AS quantity) q WHERE q.quantity > 0) m) "
+            "WHERE carts.id = :cart_id AND carts.is_active "
+            "AND (CAST(:version AS integer) IS NULL "
+            "OR carts.version = :version) "
+            "AND NOT EXISTS (SELECT FROM changes c WHERE coalesce(c.absolute, "
+            "(carts.items ->> c.product_id)::integer, 0) + c.delta "
+            "> c.max_quantity) "
+            "RETURNING carts.*"
+        ).bindparams(
+            cart_id=cart_id,
+            version=version,
+            product_ids=list(changes),
+            absolutes=[c.absolute for c in changes.values()],
+            deltas=[c.delta for c in changes.values()],
+            max_quantities=[c.max_quantity for c in changes.values()],
+        )
+        result = await self.session.execute(
+            select(Cart).from_statement(statement),
+            execution_options={"populate_existing": True},
+        )
+        cart = result.scalar_one_or_none()
+        if cart is None:
+            return None
+        await self.session.commit()
+        return StoredCart.from_model(cart)
+
+    async def merge_into_user(
+        self, cart_id: int, user_id: uuid.UUID
+    ) -> StoredCart | None:
+        # Locks both carts, clamps the summed quantities to stock, and
+        # deactivates the anonymous cart or adopts it.
+        statement = text(
+            "WITH source AS ("
+            "SELECT id, items FROM carts "
+            "WHERE id = :cart_id AND is_active AND user_id IS NULL "
+            "FOR UPDATE), "
+            "target AS ("
+            "SELECT id, items FROM carts "
+            "WHERE user_id = :user_id AND is_active "
+            "ORDER BY last_activity_at DESC, id DESC LIMIT 1 FOR UPDATE), "
+            "merged AS ("
+            "SELECT coalesce(jsonb_object_agg(q.product_id, q.quantity), "
+            "'{}') AS items FROM ("
+            "SELECT e.key AS product_id, "
+            "least(sum(e.value::integer), p.stock) AS quantity "
+            "FROM (SELECT items FROM source UNION ALL "
+            "SELECT items FROM target) c "
+            "CROSS JOIN LATERAL jsonb_each_text(c.items) e "
+            "JOIN products p ON p.id = e.key::uuid "
+            "GROUP BY e.key, p.stock) q WHERE q.quantity > 0), "
+            "deactivated AS ("
+            "UPDATE carts SET is_active = false, "
+            "version = carts.version + 1, last_activity_at = now() "
+            "WHERE carts.id = (SELECT id FROM source) "
+            "AND EXISTS (SELECT FROM target)) "
+            "UPDATE carts SET items = merged.items, user_id = :user_id, "
+            "version = carts.version + 1, last_activity_at = now() "
+            "FROM merged "
+            "WHERE carts.id = coalesce((SELECT id FROM target), "
+            "(SELECT id FROM source)) "
+            "AND EXISTS (SELECT FROM source) "
+            "RETURNING carts.*"
+        ).bindparams(cart_id=cart_id, user_id=user_id)
+        result = await self.session.execute(
+            select(Cart).from_statement(statement),
+            execution_options={"populate_existing": True},
+        )
+        cart = result.scalar_one_or_none()
+        if cart is None:
+            return None
+        await self.session.commit()
+        return StoredCart.from_model(cart)
+
+    async def get_totals(
+        self, session: AsyncSession, cart_id: int
+    ) -> CartTotals | None:
+        # The cart row is read by the aggregate itself: one round trip.
+        result = await session.execute(
+            text(
+                "SELECT coalesce(sum(i.quantity), 0), "
+                "coalesce(sum(i.price * i.quantity), 0) "
+                "FROM carts c LEFT JOIN LATERAL ("
+                "SELECT e.value::integer AS quantity, p.price "
+                "FROM jsonb_each_text(c.items) e "
+                "JOIN products p ON p.id = e.key::uuid) i ON true "
+                "WHERE c.id = :cart_id AND c.is_active GROUP BY c.id"
+            ).bindparams(cart_id=cart_id)
+        )
+        row = result.one_or_none()
+        return CartTotals(*row) if row is not None else None
+
+    async def check_out(self, session: AsyncSession, cart: StoredCart) -> bool:
+        result = await session.execute(
+            update(Cart)
+            .where(
+                Cart.id == cart.id,
+                Cart.is_active,
+                Cart.version == cart.version,
+            )
+            .values(
+                is_active=False,
+                version=Cart.version + 1,
+                last_activity_at=func.now(),
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        return result.rowcount == 1
+
+    async def _update_items(
+        self,
+        cart_id: int,
+        version: int | None,
+        items: ColumnElement[Any],
+        *conditions: ColumnElement[bool],
+    ) -> StoredCart | None:
+        """Rewrite the items of an active cart in one ``UPDATE``."""
+        if version is not None:
+            conditions += (Cart.version == version,)
+        result = await self.session.execute(
+            update(Cart)
+            .where(Cart.id == cart_id, Cart.is_active, *conditions)
+            .values(
+                items=items,
+                version=Cart.version + 1,
+                last_activity_at=func.now(),
+            )
+            .returning(Cart),
+            execution_options={"populate_existing": True},
+        )
+        cart = result.scalar_one_or_none()
+        if cart is None:
+            return None
+        await self.session.commit()
+        return StoredCart.from_model(cart)
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import func
+
+from app.db import Cart
+
+logger = logging.getLogger("app")
+
+
+async def sweep_expired_carts(
+    session: AsyncSession, expiry_days: int, batch_size: int
+) -> int:
+    """Delete carts idle for ``expiry_days``, committing every batch.
+
+    Anonymous and checked-out carts expire; active carts of signed-in users
+    are kept. Rows are claimed with ``SKIP LOCKED``, so carts being written
+    are left for the next sweep and concurrent sweepers split the work.
+    Returns the number of deleted carts.
+    """
+    cutoff = func.now() - datetime.timedelta(days=expiry_days)
+    expired = (
+        select(Cart.id)
+        .where(
+            or_(Cart.user_id.is_(None), ~Cart.is_active),
+            Cart.last_activity_at < cutoff,
+        )
+        .order_by(Cart.last_activity_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    deleted = 0
+    while True:
+        result = await session.execute(
+            delete(Cart).where(Cart.id.in_(expired.scalar_subquery())),
+            execution_options={"synchronize_session": False},
+        )
+        await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    logger.info("Swept %s expired carts", deleted)
+    return deleted
+
+
+class CartSweeper:
+    """Runs ``sweep_expired_carts`` every ``interval`` seconds."""
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        interval: float,
+        expiry_days: int,
+        batch_size: int,
+    ) -> None:
+        self.session_maker = session_maker
+        self.interval = interval
+        self.expiry_days = expiry_days
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self.session_maker() as session:
+                    await sweep_expired_carts(
+                        session, self.expiry_days, self.batch_size
+                    )
+            except Exception:
+                logger.exception("Cart sweep failed")
+            await asyncio.sleep(self.interval)
@@ -1,4 +1,6 @@
+import decimal
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -6,6 +8,32 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     database_url: str
     secret: str
+    products_page_size: int = 50
+    products_max_page_size: int = 200
+    products_batch_max_ids: int = 100
+    low_stock_threshold: int = 30
+    stock_adjustment_max_items: int = 10000
+    # "memory" keeps carts per process and is meant for tests and local runs.
+    cart_store: Literal["sql", "redis", "memory"] = "sql"
+    cart_store_url: str = "redis://localhost:6379/0"
+    # Worker processes, as given to uvicorn or gunicorn by WEB_CONCURRENCY.
+    web_concurrency: int = 1
+    cart_ttl: int = 7 * 24 * 60 * 60
+    cart_expiry_days: int = 30
+    cart_sweep_batch_size: int = 1000
+    # Seconds between sweeps in each worker; 0 leaves them to sweep_carts.py.
+    cart_sweep_interval: int = 60 * 60
+    catalog_cache_max_size: int = 1024
+    catalog_cache_ttl: float = 300
+    catalog_cache_max_bytes: int = 64 * 1024 * 1024
+    cache_invalidation_listen: bool = True
+    categories_cache_max_age: int = 60
+    product_import_batch_size: int = 5000
+    product_import_max_errors: int = 1000
+    product_export_batch_size: int = 1000
+    product_facet_price_buckets: list[decimal.Decimal] = [
+        decimal.Decimal(v) for v in ("10", "25", "50", "100", "250")
+    ]
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -6,8 +6,18 @@ from uuid import UUID
 
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
-from sqlalchemy import CheckConstraint, ForeignKey, Numeric, String
-from sqlalchemy.dialects.postgresql.json import JSON
+from sqlalchemy import (
+    DDL,
+    CheckConstraint,
+    Computed,
+    ForeignKey,
+    Index,
+    Numeric,
+    String,
+    event,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
     AsyncSession,
@@ -21,12 +31,22 @@ from .config import get_settings
 
 settings = get_settings()
 DATABASE_URL = settings.database_url
+SEARCH_CONFIG = "english"
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+
 class User(SQLAlchemyBaseUserTableUUID, Base):
     first_name: Mapped[str] = mapped_column(String(150))
     last_name: Mapped[str] = mapped_column(String(150))
@@ -42,15 +62,39 @@ class Category(Base):
         primary_key=True, server_default=func.gen_random_uuid()
     )
     name: Mapped[str] = mapped_column(String(150), unique=True)
+    # Overrides ``Settings.low_stock_threshold`` for this category.
+    low_stock_threshold: Mapped[int | None] = mapped_column(
+        CheckConstraint("low_stock_threshold >= 0")
+    )
     products: Mapped[list["Product"]] = relationship(back_populates="category")
 
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_category_id_price", "category_id", "price"),
+        Index("ix_products_stock_id", "stock", "id"),
+        Index(
+            "ix_products_category_id_created_at", "category_id", "created_at"
+        ),
+        Index(
+            "ix_products_search_vector",
+            "search_vector",
+            postgresql_using="gin",
+        ),
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(
         primary_key=True, server_default=func.gen_random_uuid()
     )
+    sku: Mapped[str | None] = mapped_column(String(64), unique=True)
     name: Mapped[str] = mapped_column(String(150))
     description: Mapped[str] = mapped_column(String(1000))
     image_url: Mapped[str] = mapped_column(String(500))
@@ -58,6 +102,15 @@ class Product(Base):
     stock: Mapped[int] = mapped_column(default=0)
     category_id: Mapped[UUID] = mapped_column(ForeignKey("categories.id"))
     created_at: Mapped[datetime] = mapped_column(default=func.now())
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR(),
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', description), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
 
     category: Mapped[Category] = relationship(back_populates="products")
     order_items: Mapped[list["OrderItem"]] = relationship(
@@ -95,15 +148,27 @@ class OrderItem(Base):
 
 class Cart(Base):
     __tablename__ = "carts"
+    __table_args__ = (
+        # Only the carts the sweeper may delete are indexed.
+        Index(
+            "ix_carts_last_activity_at",
+            "last_activity_at",
+            postgresql_where=text("user_id IS NULL OR NOT is_active"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[UUID | None] = mapped_column(
         ForeignKey("user.id"), nullable=True
     )
     created_at: Mapped[datetime] = mapped_column(default=func.now())
-    items: Mapped[dict[str, Any]] = mapped_column(JSON(), default=dict)
+    items: Mapped[dict[str, Any]] = mapped_column(JSONB(), default=dict)
     user: Mapped[User | None] = relationship("User", back_populates="carts")
     is_active: Mapped[bool] = mapped_column(default=True)
+    version: Mapped[int] = mapped_column(server_default="1")
+    last_activity_at: Mapped[datetime] = mapped_column(
+        server_default=func.now()
+    )
 
 
 engine = create_async_engine(DATABASE_URL)
@@ -0,0 +1,99 @@
+import functools
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import ORMOption
+
+type FieldSet = frozenset[str]
+
+
+@functools.cache
+def partial_model(model: type[BaseModel], fields: FieldSet) -> type[BaseModel]:
+    """Return a copy of ``model`` restricted to ``fields``.
+
+    Models are cached per field set, so each combination is only built once
+    per process.
+    """
+    definitions = {
+        name: (info.annotation, info)
+        for name, info in model.model_fields.items()
+        if name in fields
+    }
+    return create_model(
+        f"{model.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+@functools.cache
+def partial_list_adapter(
+    model: type[BaseModel], fields: FieldSet
+) -> TypeAdapter[list[BaseModel]]:
+    return TypeAdapter(list[partial_model(model, fields)])
+
+
+def fields_dependency(
+    model: type[BaseModel],
+) -> Callable[[str | None], FieldSet | None]:
+    """Build a dependency parsing a ``fields=a,b,c`` query parameter.
+
+    Only the declared fields of ``model`` may be selected; computed fields
+    are left out because they depend on other fields.
+    """
+    allowed = frozenset(model.model_fields)
+
+    def get_fields(
+        fields: str | None = Query(
+            default=None,
+            description=(
+                "Comma-separated fields to return: " + ", ".join(allowed)
+            ),
+        ),
+    ) -> FieldSet | None:
+        if fields is None:
+            return None
+        selected = frozenset(f.strip() for f in fields.split(",") if f.strip())
+        unknown = selected - allowed
+        if not selected or unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=(
+                    f"Unknown fields: {', '.join(sorted(unknown))}"
+                    if unknown
+                    else "fields must not be empty"
+                ),
+            )
+        return selected
+
+    return get_fields
+
+
+def load_options(
+    entity: type[Any],
+    fields: FieldSet | None,
+    relationships: Mapping[str, ORMOption],
+) -> list[ORMOption]:
+    """Loader options fetching only what ``fields`` will serialize.
+
+    ``relationships`` maps relationship fields to the loader used when they
+    are selected; every other field is treated as a column for
+    ``load_only``. ``None`` means all fields.
+    """
+    if fields is None:
+        return list(relationships.values())
+    primary_key = [
+        getattr(entity, column.key) for column in inspect(entity).primary_key
+    ]
+    columns = [
+        getattr(entity, name) for name in fields if name not in relationships
+    ]
+    options: list[ORMOption] = [load_only(*primary_key, *columns)]
+    options.extend(
+        loader for name, loader in relationships.items() if name in fields
+    )
+    return options
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from collections.abc import Iterable
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import CacheKey, TTLCache, catalog_cache
+
+logger = logging.getLogger("app")
+
+CHANNEL = "catalog_invalidation"
+# NOTIFY payloads must be shorter than 8000 bytes.
+MAX_PAYLOAD_SIZE = 7000
+
+
+async def publish_invalidation(
+    session: AsyncSession,
+    keys: Iterable[CacheKey] = (),
+    namespaces: Iterable[str] = (),
+) -> str:
+    """Queue a cache invalidation on the session's transaction.
+
+    PostgreSQL delivers the notification to every listening worker only
+    once the transaction commits, so readers never evict before the new
+    data is visible. The returned payload should be passed to
+    ``apply_invalidation`` after the commit to evict locally right away.
+    """
+    key_list = [list(k) for k in keys]
+    namespace_list = list(namespaces)
+    payload = json.dumps({"keys": key_list, "namespaces": namespace_list})
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        # Too many keys: drop their whole namespaces instead.
+        namespace_list = sorted({k[0] for k in key_list} | set(namespace_list))
+        payload = json.dumps({"keys": [], "namespaces": namespace_list})
+    if session.bind.dialect.name == "postgresql":
+        await session.execute(select(func.pg_notify(CHANNEL, payload)))
+    return payload
+
+
+def apply_invalidation(payload: str, cache: TTLCache = catalog_cache) -> None:
+    message = json.loads(payload)
+    for key in message["keys"]:
+        cache.invalidate(tuple(key))
+    for namespace in message["namespaces"]:
+        cache.invalidate_namespace(namespace)
+
+
+class InvalidationListener:
+    """Keeps one ``LISTEN`` connection per worker and evicts cache entries.
+
+    If the connection drops, notifications may have been missed, so the
+    whole cache is cleared before and after reconnecting.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        cache: TTLCache = catalog_cache,
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        self.dsn = make_url(database_url).set(drivername="postgresql")
+        self.cache = cache
+        self.reconnect_delay = reconnect_delay
+        self._connection: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._connection = await asyncpg.connect(
+            self.dsn.render_as_string(hide_password=False)
+        )
+        await self._connection.add_listener(CHANNEL, self._on_notification)
+        self._connection.add_termination_listener(self._on_termination)
+        logger.info("Listening for cache invalidations on %s", CHANNEL)
+
+    def start_in_background(self) -> None:
+        """Connect from a background task, retrying with backoff.
+
+        Startup does not wait for, or fail on, the database; until the
+        first connection is up, entries only expire through their TTL.
+        """
+        self._reconnect_task = asyncio.create_task(self._reconnect(delay=0))
+
+    async def stop(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            connection.remove_termination_listener(self._on_termination)
+            await connection.close()
+
+    def _on_notification(
+        self,
+        connection: asyncpg.Connection,
+        pid: int,
+        channel: str,
+        payload: str,
+    ) -> None:
+        try:
+            apply_invalidation(payload, self.cache)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed invalidation payload: %s", payload)
+            self.cache.clear()
+
+    def _on_termination(self, connection: asyncpg.Connection) -> None:
+        logger.warning("Cache invalidation connection lost, reconnecting")
+        self.cache.clear()
+        self._connection = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self, delay: float | None = None) -> None:
+        if delay is None:
+            delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as exc:
+                logger.warning("Cache invalidation reconnect failed: %s", exc)
+                delay = min(max(delay * 2, self.reconnect_delay), 30)
+                continue
+            self.cache.clear()
+            self._reconnect_task = None
+            return
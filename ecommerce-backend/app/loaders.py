@@ -0,0 +1,52 @@
+import uuid
+from collections.abc import Iterable
+from typing import Annotated
+
+from fastapi import Depends
+from sqlalchemy import ARRAY, Uuid, any_, bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Product, SessionDep
+
+
+class ProductLoader:
+    """Request-scoped memoizing product lookup.
+
+    ``load_many`` fetches every id not seen yet with one ``= ANY(:ids)``
+    query, and every product (or its absence) is remembered for the rest of
+    the request. Callers ask for all the ids they need at once; lookups are
+    awaited one at a time, as the request's session allows.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._products: dict[uuid.UUID, Product | None] = {}
+
+    async def load(self, product_id: uuid.UUID) -> Product | None:
+        return (await self.load_many([product_id]))[product_id]
+
+    async def load_many(
+        self, product_ids: Iterable[uuid.UUID]
+    ) -> dict[uuid.UUID, Product | None]:
+        product_ids = list(dict.fromkeys(product_ids))
+        missing = [pid for pid in product_ids if pid not in self._products]
+        if missing:
+            result = await self.session.execute(
+                select(Product).where(
+                    Product.id
+                    == any_(bindparam("product_ids", missing, ARRAY(Uuid)))
+                )
+            )
+            found = {product.id: product for product in result.scalars()}
+            for product_id in missing:
+                self._products[product_id] = found.get(product_id)
+        return {
+            product_id: self._products[product_id] for product_id in product_ids
+        }
+
+
+def get_product_loader(session: SessionDep) -> ProductLoader:
+    return ProductLoader(session)
+
+
+ProductLoaderDep = Annotated[ProductLoader, Depends(get_product_loader)]
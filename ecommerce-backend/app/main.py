@@ -1,11 +1,17 @@
 import json
 import logging
 import logging.config
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 
+from app.cart_store.kv import create_key_value_client
+from app.cart_sweeper import CartSweeper
+from app.config import get_settings
+from app.db import DATABASE_URL, async_session_maker, engine
+from app.invalidation import InvalidationListener
 from app.routers import carts, categories, customers, health, orders, products
 from app.schemas import UserCreate, UserRead, UserUpdate
 from app.users import auth_backend, fastapi_users
@@ -45,11 +51,42 @@ tags_metadata = [
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    app.state.key_value_client = create_key_value_client()
+    listener = None
+    if (
+        settings.cache_invalidation_listen
+        and engine.dialect.name == "postgresql"
+    ):
+        listener = InvalidationListener(DATABASE_URL)
+        listener.start_in_background()
+    sweeper = None
+    if settings.cart_sweep_interval > 0:
+        sweeper = CartSweeper(
+            async_session_maker,
+            settings.cart_sweep_interval,
+            settings.cart_expiry_days,
+            settings.cart_sweep_batch_size,
+        )
+        sweeper.start()
+    yield
+    if sweeper is not None:
+        await sweeper.stop()
+    if listener is not None:
+        await listener.stop()
+    if app.state.key_value_client is not None:
+        await app.state.key_value_client.aclose()
+
+
 app = FastAPI(
     title="Ecommerce Portfolio API",
     description="API for the Ecommerce Portfolio application.",
     version="1.0.0",
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
 )
 
 
@@ -1,20 +1,77 @@
 import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 
-from app.db import SessionDep
-from app.schemas import CartItemAdd, CartItemUpdate, CartRead, CartUpdate
+from app.cart_store import CartStoreDep
+from app.db import SessionDep, User
+from app.loaders import ProductLoaderDep
+from app.schemas import (
+    CartItemAdd,
+    CartItemUpdate,
+    CartPatch,
+    CartRead,
+    CartSummary,
+    CartUpdate,
+)
 from app.services.carts import CartService
+from app.users import current_active_user
 
 router = APIRouter()
 
 
+def get_optional_cart_version(
+    if_match: Annotated[str | None, Header()] = None,
+) -> int | None:
+    if if_match is None:
+        return None
+    tag = if_match.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match must be a cart version",
+        )
+    return int(tag)
+
+
+OptionalCartVersion = Annotated[int | None, Depends(get_optional_cart_version)]
+
+
+def get_cart_version(version: OptionalCartVersion) -> int:
+    """The cart version a mutation applies to, from its ``If-Match``.
+
+    Carts are served with their version as ``ETag``; a mutation must echo
+    it back so that it cannot overwrite changes the client has not seen.
+    """
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail="If-Match header is required",
+        )
+    return version
+
+
+CartVersion = Annotated[int, Depends(get_cart_version)]
+
+
+def cart_response(response: Response, cart: CartRead) -> CartRead:
+    response.headers["ETag"] = f'"{cart.version}"'
+    return cart
+
+
 @router.post(
     "/carts",
     status_code=status.HTTP_201_CREATED,
 )
-async def create_cart(session: SessionDep):
-    cart = await CartService.create_cart(session=session, items={})
+async def create_cart(
+    response: Response, loader: ProductLoaderDep, store: CartStoreDep
+):
+    """
+    Create an empty cart and return its id. The ``X-Cart-Token`` response
+    header carries the token needed to merge the cart into a user's later.
+    """
+    cart = await CartService.create_cart(loader=loader, store=store, items={})
+    response.headers["X-Cart-Token"] = CartService.cart_token(cart.id)
     return str(cart.id)
 
 
@@ -25,30 +82,106 @@ async def create_cart(session: SessionDep):
 async def update_cart(
     cart_id: int,
     updated_cart: CartUpdate,
-    session: SessionDep,
+    version: CartVersion,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
 ):
-    return await CartService.update_cart(
-        session=session, cart_id=cart_id, updated_cart=updated_cart
+    cart = await CartService.update_cart(
+        loader=loader,
+        store=store,
+        cart_id=cart_id,
+        updated_cart=updated_cart,
+        version=version,
     )
+    return cart_response(response, cart)
+
+
+@router.patch("/carts/{cart_id}", response_model=CartRead)
+async def patch_cart(
+    cart_id: int,
+    patch: CartPatch,
+    version: CartVersion,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
+):
+    cart = await CartService.patch_cart(
+        loader=loader,
+        store=store,
+        cart_id=cart_id,
+        patch=patch,
+        version=version,
+    )
+    return cart_response(response, cart)
+
+
+@router.post("/carts/{cart_id}/merge", response_model=CartRead)
+async def merge_cart(
+    cart_id: int,
+    x_cart_token: Annotated[str, Header()],
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
+    user: User = Depends(current_active_user),
+):
+    """
+    Merge an anonymous cart into the signed-in user's cart and return the
+    latter, whose id may differ from ``cart_id``. ``X-Cart-Token`` must be
+    the token returned when the cart was created.
+    """
+    cart = await CartService.merge_into_user_cart(
+        loader=loader,
+        store=store,
+        cart_id=cart_id,
+        user=user,
+        cart_token=x_cart_token,
+    )
+    return cart_response(response, cart)
 
 
 @router.get("/carts/{cart_id}", response_model=CartRead)
-async def get_cart(cart_id: int, session: SessionDep):
-    return await CartService.get_cart(session=session, cart_id=cart_id)
+async def get_cart(
+    cart_id: int,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
+):
+    cart = await CartService.get_cart(
+        loader=loader, store=store, cart_id=cart_id
+    )
+    return cart_response(response, cart)
+
+
+@router.get("/carts/{cart_id}/summary", response_model=CartSummary)
+async def get_cart_summary(
+    cart_id: int, session: SessionDep, store: CartStoreDep
+):
+    return await CartService.get_cart_summary(
+        session=session, store=store, cart_id=cart_id
+    )
 
 
 @router.post("/carts/{cart_id}/items/", response_model=CartRead)
 async def add_item_to_cart(
     cart_id: int,
     item: CartItemAdd,
-    session: SessionDep,
+    # Adding is applied atomically against stock, so it does not need to
+    # be based on the latest version.
+    version: OptionalCartVersion,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
 ):
-    return await CartService.add_item_to_cart(
-        session=session,
+    cart = await CartService.add_item_to_cart(
+        loader=loader,
+        store=store,
         cart_id=cart_id,
         product_id=str(item.product_id),
         quantity=item.quantity,
+        version=version,
     )
+    return cart_response(response, cart)
 
 
 @router.put("/carts/{cart_id}/items/{item_id}", response_model=CartRead)
@@ -56,24 +189,36 @@ async def update_item_in_cart(
     cart_id: int,
     item_id: uuid.UUID,
     item: CartItemUpdate,
-    session: SessionDep,
+    version: CartVersion,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
 ):
-    return await CartService.update_item_in_cart(
-        session=session,
+    cart = await CartService.update_item_in_cart(
+        loader=loader,
+        store=store,
         cart_id=cart_id,
         product_id=str(item_id),
         quantity=item.quantity,
+        version=version,
     )
+    return cart_response(response, cart)
 
 
 @router.delete("/carts/{cart_id}/items/{item_id}", response_model=CartRead)
 async def remove_item_from_cart(
     cart_id: int,
     item_id: uuid.UUID,
-    session: SessionDep,
+    version: CartVersion,
+    response: Response,
+    loader: ProductLoaderDep,
+    store: CartStoreDep,
 ):
-    return await CartService.remove_item_from_cart(
-        session=session,
+    cart = await CartService.remove_item_from_cart(
+        loader=loader,
+        store=store,
         cart_id=cart_id,
         product_id=str(item_id),
+        version=version,
     )
+    return cart_response(response, cart)
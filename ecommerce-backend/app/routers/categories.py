@@ -1,13 +1,40 @@
-from fastapi import APIRouter
-from sqlalchemy import select
+from fastapi import APIRouter, Request
+from pydantic import TypeAdapter
 
-from app.db import Category, SessionDep
-from app.schemas import CategoryRead
+from app.cache import CachedResponse, catalog_cache, conditional_response
+from app.config import get_settings
+from app.db import SessionDep
+from app.schemas import CategoryReadWithCount
+from app.services.categories import CategoryService
 
+settings = get_settings()
 router = APIRouter()
+category_list_adapter = TypeAdapter(list[CategoryReadWithCount])
 
 
-@router.get("/categories/", response_model=list[CategoryRead])
-async def read_categories(session: SessionDep):
-    result = await session.execute(select(Category))
-    return result.scalars().all()
+@router.get("/categories/", response_model=list[CategoryReadWithCount])
+async def read_categories(request: Request, session: SessionDep):
+    """
+    Served from a cached snapshot; the session only checks out a connection
+    when the snapshot has to be rebuilt. Product and category writes drop it.
+    """
+    cache_key = ("categories",)
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        generation = catalog_cache.generation("categories")
+        categories = await CategoryService.get_categories_with_counts(session)
+        cached = CachedResponse.from_body(
+            category_list_adapter.dump_json(
+                category_list_adapter.validate_python(categories)
+            )
+        )
+        catalog_cache.set(cache_key, cached, generation)
+    return conditional_response(
+        request,
+        cached,
+        headers={
+            "Cache-Control": (
+                f"public, max-age={settings.categories_cache_max_age}"
+            )
+        },
+    )
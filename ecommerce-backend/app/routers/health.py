@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import catalog_cache
 from app.db import get_async_session
+from app.users import current_superuser
 
 router = APIRouter()
 
@@ -19,3 +21,11 @@ async def health_check(session: AsyncSession = Depends(get_async_session)):
             detail="Database is not responding correctly",
         )
     return {"status": "ok", "database": "connected"}
+
+
+@router.get("/health/cache", dependencies=[Depends(current_superuser)])
+async def cache_stats() -> dict[str, int | None]:
+    """
+    Hit/miss counters and occupancy of the in-process catalog cache.
+    """
+    return catalog_cache.stats()
@@ -1,21 +1,42 @@
 import decimal
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
 
+from app.cart_store import CartStoreDep
 from app.db import SessionDep, User
+from app.fields import FieldSet, fields_dependency, partial_list_adapter
 from app.schemas import OrderCreate, OrderRead, OrderReadWithUser
 from app.services.orders import OrderService
 from app.users import current_active_user, current_superuser
 
 router = APIRouter()
+get_order_fields = fields_dependency(OrderRead)
+get_order_with_user_fields = fields_dependency(OrderReadWithUser)
+
+
+def partial_orders_response(
+    orders, model: type[OrderRead], fields: FieldSet
+) -> Response:
+    adapter = partial_list_adapter(model, fields)
+    return Response(
+        content=adapter.dump_json(
+            adapter.validate_python(orders, from_attributes=True)
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get("/orders/user", response_model=list[OrderRead])
 async def get_user_orders(
     session: SessionDep,
+    fields: Annotated[FieldSet | None, Depends(get_order_fields)],
     user: User = Depends(current_active_user),
 ):
-    return await OrderService.get_user_orders(session, user)
+    orders = await OrderService.get_user_orders(session, user, fields)
+    if fields is not None:
+        return partial_orders_response(orders, OrderRead, fields)
+    return orders
 
 
 @router.get(
@@ -25,8 +46,12 @@ async def get_user_orders(
 )
 async def read_orders(
     session: SessionDep,
+    fields: Annotated[FieldSet | None, Depends(get_order_with_user_fields)],
 ):
-    return await OrderService.get_all_orders(session)
+    orders = await OrderService.get_all_orders(session, fields)
+    if fields is not None:
+        return partial_orders_response(orders, OrderReadWithUser, fields)
+    return orders
 
 
 @router.get("/orders/count", dependencies=[Depends(current_superuser)])
@@ -59,6 +84,9 @@ async def create_order(
     cart_id: int,
     order_create: OrderCreate,
     session: SessionDep,
+    store: CartStoreDep,
     user: User = Depends(current_active_user),
 ):
-    return await OrderService.create_order(session, order_create, cart_id, user)
+    return await OrderService.create_order(
+        session, store, order_create, cart_id, user
+    )
@@ -1,40 +1,297 @@
+import decimal
+import json
 import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
+from app.cache import CachedResponse, catalog_cache, conditional_response
+from app.config import get_settings
 from app.db import Category, Product, SessionDep
+from app.fields import FieldSet, fields_dependency, partial_list_adapter
+from app.invalidation import apply_invalidation, publish_invalidation
 from app.schemas import (
+    FeedFormat,
+    ProductBatch,
     ProductCreate,
+    ProductFacets,
+    ProductFilters,
+    ProductImportResult,
+    ProductPage,
     ProductRead,
-    ProductUpdate,
     ProductReadWithCategory,
+    ProductSort,
+    ProductSuggestion,
+    ProductUpdate,
+    StockAdjustment,
+    StockLevel,
 )
+from app.services.product_export import ProductExportService
+from app.services.product_import import ProductImportService
 from app.services.products import ProductsService
 from app.users import current_superuser
 
+settings = get_settings()
 router = APIRouter()
+product_list_adapter = TypeAdapter(list[ProductReadWithCategory])
+get_product_fields = fields_dependency(ProductReadWithCategory)
+# Bounded like ``products.price`` (numeric(10, 2)), which larger values
+# would overflow.
+PriceFilter = Query(ge=0, max_digits=10, decimal_places=2)
+
+
+def get_product_filters(
+    category_id: uuid.UUID | None = None,
+    min_price: Annotated[decimal.Decimal | None, PriceFilter] = None,
+    max_price: Annotated[decimal.Decimal | None, PriceFilter] = None,
+    in_stock: bool = False,
+    sort: ProductSort | None = None,
+) -> ProductFilters:
+    if (
+        min_price is not None
+        and max_price is not None
+        and min_price > max_price
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="min_price must not be greater than max_price",
+        )
+    return ProductFilters(
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        sort=sort,
+    )
 
 
 @router.get("/products/", response_model=list[ProductReadWithCategory])
-async def read_products(session: SessionDep):
-    result = await session.execute(
-        select(Product).options(joinedload(Product.category))
+async def read_products(
+    request: Request,
+    session: SessionDep,
+    filters: Annotated[ProductFilters, Depends(get_product_filters)],
+    fields: Annotated[FieldSet | None, Depends(get_product_fields)],
+):
+    """
+    The whole filtered catalog. It is not cached: the body grows with the
+    catalog and the filters are free-form, so ``/products/page`` is the
+    listing to use at scale.
+    """
+    products = await ProductsService.get_products(session, filters, fields)
+    adapter = (
+        product_list_adapter
+        if fields is None
+        else partial_list_adapter(ProductReadWithCategory, fields)
+    )
+    rendered = CachedResponse.from_body(
+        adapter.dump_json(
+            adapter.validate_python(products, from_attributes=True)
+        )
     )
-    return result.scalars().all()
+    return conditional_response(request, rendered)
 
 
-@router.get("/products/{product_id}", response_model=ProductReadWithCategory)
-async def read_product(product_id: uuid.UUID, session: SessionDep):
-    product = await session.get(
-        Product, product_id, options=[joinedload(Product.category)]
+@router.get("/products/facets", response_model=ProductFacets)
+async def read_product_facets(
+    request: Request,
+    session: SessionDep,
+    filters: Annotated[ProductFilters, Depends(get_product_filters)],
+):
+    cache_key = (
+        "products",
+        "facets",
+        filters.model_dump_json(exclude={"sort"}),
     )
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        generation = catalog_cache.generation("products")
+        facets = await ProductsService.get_product_facets(
+            session, filters, settings.product_facet_price_buckets
         )
-    return product
+        cached = CachedResponse.from_body(facets.model_dump_json().encode())
+        catalog_cache.set(cache_key, cached, generation)
+    return conditional_response(request, cached)
+
+
+@router.get("/products/page", response_model=ProductPage)
+async def read_products_page(
+    session: SessionDep,
+    filters: Annotated[ProductFilters, Depends(get_product_filters)],
+    cursor: str | None = None,
+    limit: int = Query(
+        default=settings.products_page_size,
+        ge=1,
+        le=settings.products_max_page_size,
+    ),
+):
+    return await ProductsService.get_products_page(
+        session, filters, limit, cursor
+    )
+
+
+@router.get("/products/search", response_model=list[ProductReadWithCategory])
+async def search_products(
+    session: SessionDep,
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(
+        default=settings.products_page_size,
+        ge=1,
+        le=settings.products_max_page_size,
+    ),
+):
+    return await ProductsService.search_products(session, q, limit)
+
+
+@router.get("/products/suggest", response_model=list[ProductSuggestion])
+async def suggest_products(
+    session: SessionDep,
+    q: str = Query(min_length=1, max_length=150),
+    limit: int = Query(default=10, ge=1, le=20),
+):
+    return await ProductsService.suggest_products(session, q, limit)
+
+
+@router.get(
+    "/products/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(current_superuser)],
+)
+async def export_products(
+    session: SessionDep,
+    export_format: FeedFormat = Query(default="ndjson", alias="format"),
+):
+    media_type = (
+        "text/csv" if export_format == "csv" else "application/x-ndjson"
+    )
+    return StreamingResponse(
+        ProductExportService.export_products(session, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="products.{export_format}"'
+            )
+        },
+    )
+
+
+@router.get(
+    "/products/low-stock",
+    response_model=ProductPage,
+    dependencies=[Depends(current_superuser)],
+)
+async def read_low_stock_products(
+    session: SessionDep,
+    cursor: str | None = None,
+    limit: int = Query(
+        default=settings.products_page_size,
+        ge=1,
+        le=settings.products_max_page_size,
+    ),
+):
+    return await ProductsService.get_low_stock_products_page(
+        session, limit, cursor
+    )
+
+
+@router.get(
+    "/products/low-stock/count", dependencies=[Depends(current_superuser)]
+)
+async def get_low_stock_products_count(session: SessionDep) -> dict[str, int]:
+    """
+    Cached in the "products" namespace, which every stock change (product
+    writes, imports, orders) drops, so dashboard refreshes are O(1).
+    """
+    cache_key = ("products", "low-stock-count")
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        generation = catalog_cache.generation("products")
+        count = await ProductsService.get_low_stock_products_count(session)
+        cached = CachedResponse.from_body(json.dumps(count).encode())
+        catalog_cache.set(cache_key, cached, generation)
+    return Response(content=cached.body, media_type="application/json")
+
+
+@router.get("/products/batch", response_model=ProductBatch)
+async def read_products_batch(
+    session: SessionDep,
+    ids: Annotated[
+        list[uuid.UUID],
+        Query(min_length=1, max_length=settings.products_batch_max_ids),
+    ],
+):
+    """
+    Resolve many products at once, in request order. Cached products are
+    served from the catalog cache; the rest are loaded with a single query.
+    """
+    product_ids = list(dict.fromkeys(ids))
+    bodies: dict[uuid.UUID, bytes] = {}
+    for product_id in product_ids:
+        cached = catalog_cache.get(("product", str(product_id)))
+        if cached is not None:
+            bodies[product_id] = cached.body
+    uncached = [pid for pid in product_ids if pid not in bodies]
+    if uncached:
+        generation = catalog_cache.generation("product")
+        for product in await ProductsService.get_products_by_ids(
+            session, uncached
+        ):
+            cached = CachedResponse.from_body(
+                ProductReadWithCategory.model_validate(product)
+                .model_dump_json()
+                .encode()
+            )
+            catalog_cache.set(("product", str(product.id)), cached, generation)
+            bodies[product.id] = cached.body
+    missing = [str(pid) for pid in product_ids if pid not in bodies]
+    body = b"".join(
+        [
+            b'{"items":[',
+            b",".join(bodies[pid] for pid in product_ids if pid in bodies),
+            b'],"missing":',
+            json.dumps(missing).encode(),
+            b"}",
+        ]
+    )
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/products/{product_id}", response_model=ProductReadWithCategory)
+async def read_product(
+    request: Request, product_id: uuid.UUID, session: SessionDep
+):
+    cache_key = ("product", str(product_id))
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        generation = catalog_cache.generation("product")
+        product = await session.get(
+            Product, product_id, options=[joinedload(Product.category)]
+        )
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found",
+            )
+        cached = CachedResponse.from_body(
+            ProductReadWithCategory.model_validate(product)
+            .model_dump_json()
+            .encode()
+        )
+        catalog_cache.set(cache_key, cached, generation)
+    return conditional_response(request, cached)
 
 
 async def validate_category_exists(session: SessionDep, category_id: uuid.UUID):
@@ -46,6 +303,36 @@ async def validate_category_exists(session: SessionDep, category_id: uuid.UUID):
         )
 
 
+async def validate_sku_available(
+    session: SessionDep, sku: str, product_id: uuid.UUID | None = None
+):
+    query = select(Product.id).where(Product.sku == sku)
+    if product_id is not None:
+        query = query.where(Product.id != product_id)
+    result = await session.execute(query)
+    if result.first() is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="SKU already exists",
+        )
+
+
+def get_import_format(file: UploadFile) -> FeedFormat:
+    filename = (file.filename or "").lower()
+    content_type = file.content_type or ""
+    if filename.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or content_type in (
+        "application/x-ndjson",
+        "application/jsonl",
+    ):
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Upload a .csv or .ndjson file",
+    )
+
+
 @router.post(
     "/products/",
     response_model=ProductRead,
@@ -54,9 +341,15 @@ async def validate_category_exists(session: SessionDep, category_id: uuid.UUID):
 )
 async def create_product(product: ProductCreate, session: SessionDep):
     await validate_category_exists(session, product.category_id)
+    if product.sku is not None:
+        await validate_sku_available(session, product.sku)
     db_product = Product(**product.model_dump())
     session.add(db_product)
+    payload = await publish_invalidation(
+        session, namespaces=["products", "categories"]
+    )
     await session.commit()
+    apply_invalidation(payload)
     await session.refresh(db_product)
     return db_product
 
@@ -79,17 +372,65 @@ async def update_product(
     product_data = product_update.model_dump(exclude_unset=True)
     if "category_id" in product_data:
         await validate_category_exists(session, product_data["category_id"])
+    if product_data.get("sku") is not None:
+        await validate_sku_available(session, product_data["sku"], product_id)
 
     for key, value in product_data.items():
         setattr(db_product, key, value)
     session.add(db_product)
+    namespaces = ["products"]
+    if "category_id" in product_data:
+        namespaces.append("categories")
+    payload = await publish_invalidation(
+        session, keys=[("product", str(product_id))], namespaces=namespaces
+    )
     await session.commit()
+    apply_invalidation(payload)
     await session.refresh(db_product)
     return db_product
 
 
-@router.get(
-    "/products/low-stock/count", dependencies=[Depends(current_superuser)]
+@router.post(
+    "/products/import",
+    response_model=ProductImportResult,
+    dependencies=[Depends(current_superuser)],
 )
-async def get_low_stock_products_count(session: SessionDep) -> dict[str, int]:
-    return await ProductsService.get_low_stock_products_count(session)
+async def import_products(file: UploadFile, session: SessionDep):
+    import_format = get_import_format(file)
+    result = await ProductImportService.import_products(
+        session, file.file, import_format
+    )
+    payload = await publish_invalidation(
+        session, namespaces=["product", "products", "categories"]
+    )
+    await session.commit()
+    apply_invalidation(payload)
+    return result
+
+
+@router.post(
+    "/products/stock",
+    response_model=list[StockLevel],
+    dependencies=[Depends(current_superuser)],
+)
+async def adjust_stock(
+    session: SessionDep,
+    adjustments: Annotated[
+        list[StockAdjustment],
+        Body(min_length=1, max_length=settings.stock_adjustment_max_items),
+    ],
+):
+    """
+    Set or shift the stock of many products at once. Either every
+    adjustment is applied or, if a product is unknown or would drop below
+    zero, none is.
+    """
+    levels = await ProductsService.adjust_stock(session, adjustments)
+    payload = await publish_invalidation(
+        session,
+        keys=[("product", str(level.product_id)) for level in levels],
+        namespaces=["products"],
+    )
+    await session.commit()
+    apply_invalidation(payload)
+    return levels
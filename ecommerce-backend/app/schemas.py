@@ -1,10 +1,16 @@
 import datetime
 import decimal
 import uuid
-from typing import Annotated
+from typing import Annotated, Literal
 
 from fastapi_users import schemas
-from pydantic import BaseModel, ConfigDict, Field, computed_field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    computed_field,
+    model_validator,
+)
 
 
 class UserRead(schemas.BaseUser[uuid.UUID]):
@@ -29,6 +35,10 @@ class CategoryRead(BaseModel):
     id: uuid.UUID
 
 
+class CategoryReadWithCount(CategoryRead):
+    product_count: int
+
+
 class CategoryCreate(CategoryRead):
     pass
 
@@ -37,14 +47,21 @@ class CategoryUpdate(CategoryRead):
     pass
 
 
+# Bounded like products.price (numeric(10, 2)) and products.stock (integer).
 type ProductPrice = Annotated[
-    decimal.Decimal, Field(allow_inf_nan=False, decimal_places=2, gt=0)
+    decimal.Decimal,
+    Field(allow_inf_nan=False, max_digits=10, decimal_places=2, gt=0),
 ]
+type ProductStock = Annotated[int, Field(ge=0, le=2**31 - 1)]
+
+
+type ProductSku = Annotated[str, Field(min_length=1, max_length=64)]
 
 
 class ProductRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: uuid.UUID
+    sku: str | None = None
     name: str
     description: str
     image_url: str
@@ -57,24 +74,115 @@ class ProductReadWithCategory(ProductRead):
     category: CategoryRead
 
 
+type ProductSort = Literal["newest", "price_asc", "price_desc"]
+
+
+class ProductFilters(BaseModel):
+    category_id: uuid.UUID | None = None
+    min_price: decimal.Decimal | None = None
+    max_price: decimal.Decimal | None = None
+    in_stock: bool = False
+    sort: ProductSort | None = None
+
+
+class CategoryFacet(BaseModel):
+    category_id: uuid.UUID
+    count: int
+
+
+class PriceBucketFacet(BaseModel):
+    min_price: ProductPrice | None
+    max_price: ProductPrice | None
+    count: int
+
+
+class ProductFacets(BaseModel):
+    total: int
+    in_stock: int
+    categories: list[CategoryFacet]
+    price_buckets: list[PriceBucketFacet]
+
+
+class ProductPage(BaseModel):
+    items: list[ProductReadWithCategory]
+    next_cursor: str | None
+
+
+class ProductBatch(BaseModel):
+    items: list[ProductReadWithCategory]
+    missing: list[uuid.UUID]
+
+
+class ProductSuggestion(BaseModel):
+    id: uuid.UUID
+    name: str
+
+
 class ProductCreate(BaseModel):
+    sku: ProductSku | None = None
     name: str
     description: str
     image_url: str
     price: ProductPrice
-    stock: int = Field(ge=0)
+    stock: ProductStock
     category_id: uuid.UUID
 
 
 class ProductUpdate(BaseModel):
+    sku: ProductSku | None = None
     name: str | None = None
     description: str | None = None
     image_url: str | None = None
     price: ProductPrice | None = None
-    stock: int | None = Field(ge=0, default=None)
+    stock: ProductStock | None = None
     category_id: uuid.UUID | None = None
 
 
+type FeedFormat = Literal["csv", "ndjson"]
+
+
+class ProductImportRow(BaseModel):
+    sku: ProductSku
+    name: str = Field(min_length=1, max_length=150)
+    description: str = Field(max_length=1000)
+    image_url: str = Field(max_length=500)
+    price: ProductPrice
+    stock: ProductStock
+    category: str = Field(min_length=1, max_length=150)
+
+
+class ProductImportError(BaseModel):
+    line: int
+    message: str
+
+
+class ProductImportResult(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    errors: list[ProductImportError]
+
+
+class StockAdjustment(BaseModel):
+    """Either add ``delta`` to the current stock or set it to ``absolute``."""
+
+    product_id: uuid.UUID
+    delta: Annotated[int, Field(ge=-(2**31), le=2**31 - 1)] | None = None
+    absolute: ProductStock | None = None
+
+    @model_validator(mode="after")
+    def check_one_of(self) -> "StockAdjustment":
+        if (self.delta is None) == (self.absolute is None):
+            raise ValueError("Provide exactly one of delta or absolute")
+        return self
+
+
+class StockLevel(BaseModel):
+    product_id: uuid.UUID
+    sku: str | None
+    stock: int
+
+
 class OrderItemRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: int
@@ -145,6 +253,7 @@ class CartRead(BaseModel):
     user_id: uuid.UUID | None
     items: list[CartItemEnriched]
     summary: CartSummary
+    version: int
 
 
 class CartCreate(BaseModel):
@@ -164,3 +273,19 @@ class CartItemAdd(BaseModel):
 
 class CartItemUpdate(BaseModel):
     quantity: int = Field(gt=0)
+
+
+class CartItemOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    product_id: uuid.UUID
+    quantity: int | None = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def check_quantity(self) -> "CartItemOperation":
+        if (self.op == "remove") != (self.quantity is None):
+            raise ValueError("quantity is required for add and set only")
+        return self
+
+
+class CartPatch(BaseModel):
+    operations: list[CartItemOperation] = Field(min_length=1, max_length=100)
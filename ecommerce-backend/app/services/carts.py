@@ -1,162 +1,291 @@
 import decimal
+import hashlib
+import hmac
+import logging
 import uuid
 from typing import cast
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import Cart, Product
+from app.cart_store.base import CartStore, ItemChange, StoredCart
+from app.config import get_settings
+from app.db import Product, User
+from app.loaders import ProductLoader
 from app.schemas import (
     CartItemEnriched,
+    CartPatch,
     CartRead,
     CartSummary,
     CartUpdate,
 )
-import logging
 
 logger = logging.getLogger("app")
+settings = get_settings()
 
 
 class CartService:
+    """Cart operations.
+
+    Products are looked up through the request's ``ProductLoader``: each
+    operation asks for every product it will need (the cart's and the one
+    being changed) up front, so it costs exactly one product query.
+
+    Mutations given the ``version`` the client last saw only apply to that
+    version of the cart, and fail with 409 once it has moved on.
+    """
 
     @staticmethod
     async def create_cart(
-        session: AsyncSession,
+        loader: ProductLoader,
+        store: CartStore,
         items: dict[str, int],
         user_id: uuid.UUID | None = None,
     ):
-        cart = Cart(user_id=user_id, items=items)
-        session.add(cart)
-        await session.commit()
-        await session.refresh(cart)
-        return await CartService._get_cart_read_from_model(session, cart)
+        cart = await store.create(items, user_id)
+        return await CartService._get_cart_read_from_model(loader, cart)
 
     @staticmethod
-    async def get_cart(session: AsyncSession, cart_id: int):
-        cart = await session.get(Cart, cart_id)
-        if not CartService.is_valid_cart(cart):
+    async def get_cart(loader: ProductLoader, store: CartStore, cart_id: int):
+        cart = await CartService._get_valid_cart(store, cart_id)
+        return await CartService._get_cart_read_from_model(loader, cart)
+
+    @staticmethod
+    async def get_cart_summary(
+        session: AsyncSession, store: CartStore, cart_id: int
+    ) -> CartSummary:
+        """Totals of a cart, without loading or enriching its products."""
+        totals = await store.get_totals(session, cart_id)
+        if totals is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
             )
-        cart = cast(Cart, cart)
-        return await CartService._get_cart_read_from_model(session, cart)
+        return CartSummary(
+            subtotal=totals.subtotal,
+            grand_total=totals.subtotal,
+            total_items_count=totals.total_items_count,
+        )
 
     @staticmethod
     async def update_cart(
-        session: AsyncSession,
+        loader: ProductLoader,
+        store: CartStore,
         cart_id: int,
         updated_cart: CartUpdate,
+        version: int | None = None,
     ):
-        cart = await session.get(Cart, cart_id)
-        if not CartService.is_valid_cart(cart):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
-            )
-        cart = cast(Cart, cart)
-        product_ids = list(updated_cart.items.keys())
-        if not product_ids:
-            return await CartService._get_cart_read_from_model(session, cart)
-        result = await session.execute(
-            select(Product).where(Product.id.in_(product_ids))
+        cart = await CartService._get_valid_cart(store, cart_id, version)
+        products = await CartService._load_products(
+            loader, cart, *updated_cart.items
         )
-        products = result.scalars().all()
-        products_map = {str(p.id): p for p in products}
-        items = cart.items.copy()
-        for p_id, quantity in updated_cart.items.items():
-            product_id = str(p_id)
-            product = products_map.get(product_id)
-            CartService.validate_product_stock(product_id, product, quantity)
-            items[product_id] = quantity
-        cart.items = items
-        await session.commit()
-        return await CartService._get_cart_read_from_model(session, cart)
+        items = {str(p_id): q for p_id, q in updated_cart.items.items()}
+        for product_id, quantity in items.items():
+            CartService.validate_product_stock(
+                product_id, products[uuid.UUID(product_id)], quantity
+            )
+        updated = await store.merge_items(cart_id, items, version)
+        if updated is None:
+            await CartService._get_valid_cart(store, cart_id, version)
+            raise CartService._conflict()
+        return await CartService._get_cart_read_from_model(loader, updated)
 
     @staticmethod
     async def add_item_to_cart(
-        session: AsyncSession,
+        loader: ProductLoader,
+        store: CartStore,
         cart_id: int,
         product_id: str,
         quantity: int,
+        version: int | None = None,
     ):
-        cart_obj = await session.get(Cart, cart_id)
-        if not CartService.is_valid_cart(cart_obj):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
-            )
-        cart = cast(Cart, cart_obj)
-
-        product = await session.get(Product, uuid.UUID(product_id))
+        cart = await CartService._get_valid_cart(store, cart_id, version)
+        products = await CartService._load_products(
+            loader, cart, uuid.UUID(product_id)
+        )
+        product = products[uuid.UUID(product_id)]
         CartService.validate_product_stock(product_id, product, quantity)
+        product = cast(Product, product)
 
-        items = cart.items.copy()
-        current_quantity = items.get(product_id, 0)
-        new_quantity = current_quantity + quantity
-
-        # Re-validate total quantity after addition
-        CartService.validate_product_stock(product_id, product, new_quantity)
-
-        items[product_id] = new_quantity
-        cart.items = items
-        await session.commit()
-        return await CartService._get_cart_read_from_model(session, cart)
+        # The store re-validates the new total against stock atomically, so
+        # concurrent adds cannot push the cart past it.
+        updated = await store.add_item(
+            cart_id, product_id, quantity, product.stock, version
+        )
+        if updated is None:
+            await CartService._get_valid_cart(store, cart_id, version)
+            logger.info("Not enough stock for product %s", product.id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough stock for product {product.name}",
+            )
+        return await CartService._get_cart_read_from_model(loader, updated)
 
     @staticmethod
     async def update_item_in_cart(
-        session: AsyncSession,
+        loader: ProductLoader,
+        store: CartStore,
         cart_id: int,
         product_id: str,
         quantity: int,
+        version: int | None = None,
     ):
-        cart_obj = await session.get(Cart, cart_id)
-        if not CartService.is_valid_cart(cart_obj):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
-            )
-        cart = cast(Cart, cart_obj)
-        if product_id not in cart.items:
+        cart = await CartService._get_valid_cart(store, cart_id, version)
+        products = await CartService._load_products(
+            loader, cart, uuid.UUID(product_id)
+        )
+        CartService.validate_product_stock(
+            product_id, products[uuid.UUID(product_id)], quantity
+        )
+        updated = await store.set_item(cart_id, product_id, quantity, version)
+        if updated is None:
+            await CartService._get_valid_cart(store, cart_id, version)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Product {product_id} not in cart",
             )
-        product = await session.get(Product, uuid.UUID(product_id))
-        CartService.validate_product_stock(product_id, product, quantity)
-
-        items = cart.items.copy()
-        items[product_id] = quantity
-        cart.items = items
-        await session.commit()
-        return await CartService._get_cart_read_from_model(session, cart)
+        return await CartService._get_cart_read_from_model(loader, updated)
 
     @staticmethod
     async def remove_item_from_cart(
-        session: AsyncSession,
+        loader: ProductLoader,
+        store: CartStore,
         cart_id: int,
         product_id: str,
+        version: int | None = None,
     ):
-        cart_obj = await session.get(Cart, cart_id)
-        if not CartService.is_valid_cart(cart_obj):
+        cart = await store.remove_item(cart_id, product_id, version)
+        if cart is None:
+            await CartService._get_valid_cart(store, cart_id, version)
+            raise CartService._conflict()
+        return await CartService._get_cart_read_from_model(loader, cart)
+
+    @staticmethod
+    async def patch_cart(
+        loader: ProductLoader,
+        store: CartStore,
+        cart_id: int,
+        patch: CartPatch,
+        version: int | None = None,
+    ):
+        """Apply a batch of add/set/remove operations as one change.
+
+        Operations on the same product are folded in order; stock is
+        checked for the resulting quantities, which the store applies all
+        together or not at all.
+        """
+        cart = await CartService._get_valid_cart(store, cart_id, version)
+        products = await CartService._load_products(
+            loader,
+            cart,
+            *(operation.product_id for operation in patch.operations),
+        )
+        changes: dict[str, ItemChange] = {}
+        for operation in patch.operations:
+            product_id = str(operation.product_id)
+            change = changes.setdefault(product_id, ItemChange())
+            if operation.op == "add":
+                change.delta += cast(int, operation.quantity)
+            else:
+                change.absolute = operation.quantity or 0
+                change.delta = 0
+        for product_id, change in changes.items():
+            quantity = change.apply(cart.items.get(product_id, 0))
+            if quantity > 0:
+                product = products[uuid.UUID(product_id)]
+                CartService.validate_product_stock(
+                    product_id, product, quantity
+                )
+                change.max_quantity = cast(Product, product).stock
+        updated = await store.apply_changes(cart_id, changes, version)
+        if updated is None:
+            await CartService._get_valid_cart(store, cart_id, version)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Cart changed concurrently beyond available stock",
+            )
+        return await CartService._get_cart_read_from_model(loader, updated)
+
+    @staticmethod
+    def cart_token(cart_id: int) -> str:
+        """Proof of holding cart ``cart_id``, handed out when it is created.
+
+        Cart ids are sequential, so the id alone does not show that a
+        caller has ever seen the cart.
+        """
+        return hmac.new(
+            settings.secret.encode(), f"cart:{cart_id}".encode(), hashlib.sha256
+        ).hexdigest()
+
+    @staticmethod
+    async def merge_into_user_cart(
+        loader: ProductLoader,
+        store: CartStore,
+        cart_id: int,
+        user: User,
+        cart_token: str,
+    ):
+        """Hand the anonymous cart ``cart_id`` over to ``user`` on login.
+
+        ``cart_token`` must be the token issued with the cart. Merging a
+        cart the user already owns returns it unchanged, so the call can
+        safely be retried.
+        """
+        if not hmac.compare_digest(cart_token, CartService.cart_token(cart_id)):
+            logger.info("Invalid token for cart %s", cart_id)
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid cart token",
+            )
+        cart = await store.merge_into_user(cart_id, user.id)
+        if cart is None:
+            cart = await CartService._get_valid_cart(store, cart_id)
+            if cart.user_id != user.id:
+                logger.info("Cart %s cannot be merged", cart_id)
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Cart not found",
+                )
+        return await CartService._get_cart_read_from_model(loader, cart)
+
+    @staticmethod
+    async def _load_products(
+        loader: ProductLoader, cart: StoredCart, *product_ids: uuid.UUID
+    ) -> dict[uuid.UUID, Product | None]:
+        return await loader.load_many(
+            [*product_ids, *(uuid.UUID(pid) for pid in cart.items)]
+        )
+
+    @staticmethod
+    async def _get_valid_cart(
+        store: CartStore, cart_id: int, version: int | None = None
+    ) -> StoredCart:
+        cart = await store.get(cart_id)
+        if not CartService.is_valid_cart(cart):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
             )
-        cart = cast(Cart, cart_obj)
-        if product_id not in cart.items:
-            return await CartService._get_cart_read_from_model(session, cart)
-        items = cart.items.copy()
-        del items[product_id]
-        cart.items = items
-        await session.commit()
-        return await CartService._get_cart_read_from_model(session, cart)
+        cart = cast(StoredCart, cart)
+        if version is not None and cart.version != version:
+            raise CartService._conflict()
+        return cart
+
+    @staticmethod
+    def _conflict() -> HTTPException:
+        logger.info("Cart version conflict")
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Cart was modified; reload it and retry",
+        )
 
     @staticmethod
-    def is_valid_cart(cart: Cart | None) -> bool:
+    def is_valid_cart(cart: StoredCart | None) -> bool:
         valid_cart = bool(cart and cart.is_active)
         if not valid_cart:
             logger.info("Cart not valid: %s", cart)
         return valid_cart
 
     @staticmethod
-    def is_cart_empty(cart: Cart):
+    def is_cart_empty(cart: StoredCart):
         if not cart.items:
             return True
         for quantity in cart.items.values():
@@ -166,23 +295,18 @@ class CartService:
 
     @staticmethod
     async def _get_cart_read_from_model(
-        session: AsyncSession, cart: Cart
+        loader: ProductLoader, cart: StoredCart
     ) -> CartRead:
-        product_ids = [uuid.UUID(pid) for pid in cart.items.keys()]
-        products_map = {}
-        if product_ids:
-            result = await session.execute(
-                select(Product).where(Product.id.in_(product_ids))
-            )
-            products = result.scalars().all()
-            products_map = {str(p.id): p for p in products}
+        products_map = await loader.load_many(
+            uuid.UUID(pid) for pid in cart.items
+        )
 
         enriched_items = []
         subtotal = decimal.Decimal(0)
         total_items_count = 0
 
         for pid_str, quantity in cart.items.items():
-            product = products_map.get(pid_str)
+            product = products_map[uuid.UUID(pid_str)]
             if not product:
                 continue
 
@@ -215,6 +339,7 @@ class CartService:
             user_id=cart.user_id,
             items=enriched_items,
             summary=summary,
+            version=cart.version,
             updated_at=cart.created_at,
         )
 
@@ -0,0 +1,27 @@
+from typing import Sequence
+
+from sqlalchemy import RowMapping, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Category, Product
+
+
+class CategoryService:
+
+    @staticmethod
+    async def get_categories_with_counts(
+        session: AsyncSession,
+    ) -> Sequence[RowMapping]:
+        """All categories with their number of products, in one query."""
+        query = (
+            select(
+                Category.id,
+                Category.name,
+                func.count(Product.id).label("product_count"),
+            )
+            .outerjoin(Product, Product.category_id == Category.id)
+            .group_by(Category.id)
+            .order_by(Category.name, Category.id)
+        )
+        result = await session.execute(query)
+        return result.mappings().all()
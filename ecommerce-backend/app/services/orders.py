@@ -3,12 +3,15 @@ import logging
 from typing import Sequence, cast
 
 from fastapi import HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm.strategy_options import selectinload
 
-from app.db import Cart, Order, OrderItem, Product, User
-from app.schemas import OrderCreate
+from app.cart_store.base import CartStore, StoredCart
+from app.db import Order, OrderItem, Product, User
+from app.fields import FieldSet, load_options
+from app.invalidation import apply_invalidation, publish_invalidation
+from app.schemas import OrderCreate, OrderItemRead, OrderRead, ProductRead
 from app.services.carts import CartService
 
 logger = logging.getLogger("app")
@@ -17,25 +20,37 @@ logger = logging.getLogger("app")
 class OrderService:
 
     @staticmethod
-    async def get_all_orders(session: AsyncSession) -> Sequence[Order]:
-        query = select(Order).options(
-            selectinload(Order.user),
-            selectinload(Order.order_items).selectinload(OrderItem.product),
+    async def get_all_orders(
+        session: AsyncSession, fields: FieldSet | None = None
+    ) -> Sequence[Order]:
+        options = load_options(
+            Order,
+            fields,
+            {
+                "user": selectinload(Order.user),
+                "order_items": selectinload(Order.order_items).selectinload(
+                    OrderItem.product
+                ),
+            },
         )
+        query = select(Order).options(*options)
         result = await session.execute(query)
         return result.scalars().all()
 
     @staticmethod
     async def get_user_orders(
-        session: AsyncSession, user: User
+        session: AsyncSession, user: User, fields: FieldSet | None = None
     ) -> Sequence[Order]:
-        query = (
-            select(Order)
-            .options(
-                selectinload(Order.order_items).selectinload(OrderItem.product)
-            )
-            .where(Order.user_id == user.id)
+        options = load_options(
+            Order,
+            fields,
+            {
+                "order_items": selectinload(Order.order_items).selectinload(
+                    OrderItem.product
+                ),
+            },
         )
+        query = select(Order).options(*options).where(Order.user_id == user.id)
         result = await session.execute(query)
         return result.scalars().all()
 
@@ -64,64 +79,144 @@ class OrderService:
     @staticmethod
     async def create_order(
         session: AsyncSession,
+        store: CartStore,
         order_create: OrderCreate,
         cart_id: int,
         user: User,
-    ):
+    ) -> OrderRead:
         logger.info("Creating order for user %s and cart %s", user.id, cart_id)
-        result = await session.execute(select(Cart).where(Cart.id == cart_id))
-        cart = result.scalar_one_or_none()
+        cart = await store.get(cart_id)
         if not CartService.is_valid_cart(cart):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Cart is not active",
             )
-        cart = cast(Cart, cart)
+        cart = cast(StoredCart, cart)
         if CartService.is_cart_empty(cart):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cart is empty",
             )
-        product_ids = list(cart.items.keys())
+        # Queued before the stock rows are locked, so the round trip is not
+        # spent holding them; a failed checkout rolls it back with the rest.
+        payload = await publish_invalidation(
+            session,
+            keys=[("product", product_id) for product_id in cart.items],
+            namespaces=["products"],
+        )
+        products_map = await OrderService._decrement_stock(session, cart.items)
+        # The cart is claimed only once the stock is taken, so a shortfall
+        # leaves it untouched; a concurrent second checkout of it fails here
+        # and its decrement is rolled back.
+        if not await store.check_out(session, cart):
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Cart changed during checkout, please retry",
+            )
+        # The order and its items are written by one statement, and the
+        # response is built from what it returns, so the order is not read
+        # back after the commit.
+        ordered = [products_map[product_id] for product_id in cart.items]
         result = await session.execute(
-            select(Product).where(Product.id.in_(product_ids)).with_for_update()
+            text(
+                "WITH o AS ("
+                "INSERT INTO orders (status, shipping_address, user_id, "
+                "created_at) VALUES (:status, :shipping_address, :user_id, "
+                "now()) RETURNING id, created_at) "
+                "INSERT INTO order_items "
+                "(order_id, product_id, quantity, price) "
+                "SELECT o.id, i.product_id, i.quantity, i.price FROM o, "
+                "unnest(CAST(:product_ids AS uuid[]), "
+                "CAST(:quantities AS integer[]), CAST(:prices AS numeric[])) "
+                "AS i(product_id, quantity, price) "
+                "RETURNING order_items.id, order_items.order_id, "
+                "order_items.product_id, order_items.quantity, "
+                "order_items.price, (SELECT created_at FROM o) AS created_at"
+            ).bindparams(
+                status="pending",
+                shipping_address=order_create.shipping_address,
+                user_id=user.id,
+                product_ids=[product.id for product in ordered],
+                quantities=list(cart.items.values()),
+                prices=[product.price for product in ordered],
+            )
         )
-        products = result.scalars().all()
-        products_map = {str(p.id): p for p in products}
-        order = Order(
+        rows = result.all()
+        created_order = OrderRead(
+            id=rows[0].order_id,
             status="pending",
             shipping_address=order_create.shipping_address,
-            user=user,
+            created_at=rows[0].created_at,
+            order_items=[
+                OrderItemRead(
+                    id=row.id,
+                    product_id=row.product_id,
+                    quantity=row.quantity,
+                    product=ProductRead.model_validate(
+                        products_map[str(row.product_id)]
+                    ),
+                    price=row.price,
+                )
+                for row in rows
+            ],
         )
-        session.add(order)
-        await session.flush()  # To get order.id
-        for product_id, quantity in cart.items.items():
-            product = products_map.get(product_id)
-            CartService.validate_product_stock(product_id, product, quantity)
-            product = cast(Product, product)
-            product.stock -= quantity
-            order_item = OrderItem(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=product.price,
-            )
-            session.add(order_item)
-        cart.is_active = False
         await session.commit()
-        # Refresh to load relationships
-        query = (
-            select(Order)
-            .options(
-                selectinload(Order.order_items).selectinload(OrderItem.product)
-            )
-            .where(Order.id == order.id)
-        )
-        result = await session.execute(query)
-        created_order = result.scalar_one()
+        await store.release(cart.id)
+        apply_invalidation(payload)
         logger.info(f"Order {created_order.id} created successfully")
         return created_order
 
+    @staticmethod
+    async def _decrement_stock(
+        session: AsyncSession, items: dict[str, int]
+    ) -> dict[str, Product]:
+        """Take ``items`` out of stock with a single ``UPDATE``.
+
+        The products are first locked in id order by a ``FOR UPDATE`` CTE,
+        as in ``ProductsService.adjust_stock``, so concurrent checkouts take
+        their locks in the same order and cannot deadlock. The update skips
+        any product without enough stock; a short row count therefore means
+        a shortfall, and the transaction is rolled back.
+        """
+        statement = text(
+            "WITH v AS (SELECT * FROM unnest(CAST(:product_ids AS uuid[]), "
+            "CAST(:quantities AS integer[])) AS v(product_id, quantity)), "
+            "locked AS (SELECT p.id FROM products p "
+            "WHERE p.id = ANY(CAST(:product_ids AS uuid[])) "
+            "ORDER BY p.id FOR UPDATE) "
+            "UPDATE products p SET stock = p.stock - v.quantity "
+            "FROM v JOIN locked l ON l.id = v.product_id "
+            "WHERE p.id = v.product_id AND p.stock >= v.quantity "
+            "RETURNING p.*"
+        ).bindparams(
+            product_ids=list(items),
+            quantities=list(items.values()),
+        )
+        result = await session.execute(
+            select(Product).from_statement(statement),
+            execution_options={"populate_existing": True},
+        )
+        products = {str(product.id): product for product in result.scalars()}
+        if len(products) == len(items):
+            return products
+
+        await session.rollback()
+        short = {pid: q for pid, q in items.items() if pid not in products}
+        result = await session.execute(
+            select(Product).where(Product.id.in_(list(short)))
+        )
+        current = {str(product.id): product for product in result.scalars()}
+        for product_id, quantity in short.items():
+            CartService.validate_product_stock(
+                product_id, current.get(product_id), quantity
+            )
+        # Stock was restored between the update and the lookup.
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Stock changed during checkout, please retry",
+        )
+
     @staticmethod
     async def get_all_orders_count(session: AsyncSession) -> dict[str, int]:
         query = select(func.count()).select_from(Order)
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import Category, Product
+from app.schemas import FeedFormat
+
+settings = get_settings()
+
+EXPORT_COLUMNS = [
+    "id",
+    "sku",
+    "name",
+    "description",
+    "image_url",
+    "price",
+    "stock",
+    "category",
+]
+
+
+class ProductExportService:
+
+    @staticmethod
+    async def export_products(
+        session: AsyncSession, export_format: FeedFormat
+    ) -> AsyncIterator[str]:
+        """Stream the catalog as CSV or NDJSON in constant memory.
+
+        Rows come from a server-side cursor in batches of
+        ``product_export_batch_size``. Plain columns are selected instead of
+        ``Product`` entities so the session's identity map does not grow
+        with the catalog. The output uses the same columns as the import
+        feed.
+        """
+        query = (
+            select(
+                Product.id,
+                Product.sku,
+                Product.name,
+                Product.description,
+                Product.image_url,
+                Product.price,
+                Product.stock,
+                Category.name.label("category"),
+            )
+            .join(Product.category)
+            .order_by(Product.created_at, Product.id)
+            .execution_options(yield_per=settings.product_export_batch_size)
+        )
+        result = await session.stream(query)
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in result.partitions():
+                writer.writerows(partition)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+            return
+        async for partition in result.partitions():
+            yield "".join(
+                json.dumps(row._asdict(), default=str) + "\n"
+                for row in partition
+            )
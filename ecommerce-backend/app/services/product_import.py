@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import logging
+from collections.abc import Callable, Iterator
+from typing import IO, Any
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool
+
+from app.config import get_settings
+from app.schemas import (
+    FeedFormat,
+    ProductImportError,
+    ProductImportResult,
+    ProductImportRow,
+)
+
+logger = logging.getLogger("app")
+settings = get_settings()
+
+STAGING_TABLE = "product_import"
+STAGING_COLUMNS = [
+    "line",
+    "sku",
+    "name",
+    "description",
+    "image_url",
+    "price",
+    "stock",
+    "category",
+]
+
+
+class ProductImportService:
+
+    @staticmethod
+    async def import_products(
+        session: AsyncSession, file: IO[bytes], import_format: FeedFormat
+    ) -> ProductImportResult:
+        """Upsert products from a CSV or NDJSON feed keyed on ``sku``.
+
+        Valid rows are streamed in batches into a temporary table with
+        ``COPY``; category names are then resolved and all products are
+        upserted by a single ``INSERT ... SELECT ... ON CONFLICT``. Rows that
+        fail validation or name an unknown category are reported as errors.
+        """
+        errors: list[ProductImportError] = []
+        rejected = 0
+
+        def reject(line: int, message: str) -> None:
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < settings.product_import_max_errors:
+                errors.append(ProductImportError(line=line, message=message))
+
+        await session.execute(
+            text(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ("
+                "line integer, sku text, name text, description text, "
+                "image_url text, price numeric(10, 2), stock integer, "
+                "category text) ON COMMIT DROP"
+            )
+        )
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        # Reading and validating rows is CPU-bound and reads from a spooled
+        # file, so it runs in a worker thread, one batch at a time.
+        batches = ProductImportService._parse_batches(
+            file, import_format, reject
+        )
+        async for batch in iterate_in_threadpool(batches):
+            await driver_connection.copy_records_to_table(
+                STAGING_TABLE, records=batch, columns=STAGING_COLUMNS
+            )
+
+        unknown = await session.execute(
+            text(
+                f"SELECT i.line, i.category FROM {STAGING_TABLE} i "
+                "LEFT JOIN categories c ON c.name = i.category "
+                "WHERE c.id IS NULL ORDER BY i.line"
+            )
+        )
+        for line, category in unknown:
+            reject(line, f"Unknown category {category!r}")
+
+        # DISTINCT ON keeps the last occurrence of a SKU repeated in the feed.
+        result = await session.execute(
+            text(
+                "WITH upserted AS ("
+                "INSERT INTO products (sku, name, description, image_url, "
+                "price, stock, category_id, created_at) "
+                "SELECT DISTINCT ON (i.sku) i.sku, i.name, i.description, "
+                "i.image_url, i.price, i.stock, c.id, now() "
+                f"FROM {STAGING_TABLE} i "
+                "JOIN categories c ON c.name = i.category "
+                "ORDER BY i.sku, i.line DESC "
+                "ON CONFLICT (sku) DO UPDATE SET "
+                "name = excluded.name, description = excluded.description, "
+                "image_url = excluded.image_url, price = excluded.price, "
+                "stock = excluded.stock, category_id = excluded.category_id "
+                "RETURNING xmax = 0 AS inserted) "
+                "SELECT count(*) FILTER (WHERE inserted), "
+                "count(*) FILTER (WHERE NOT inserted) FROM upserted"
+            )
+        )
+        inserted, updated = result.one()
+        errors.sort(key=lambda e: e.line)
+        logger.info(
+            "Imported products: %s inserted, %s updated, %s rejected",
+            inserted,
+            updated,
+            rejected,
+        )
+        return ProductImportResult(
+            inserted=inserted,
+            updated=updated,
+            rejected=rejected,
+            errors=errors,
+        )
+
+    @staticmethod
+    def _parse_batches(
+        file: IO[bytes],
+        import_format: FeedFormat,
+        reject: Callable[[int, str], None],
+    ) -> Iterator[list[tuple[Any, ...]]]:
+        """Yield batches of validated staging rows, rejecting invalid ones."""
+        batch: list[tuple[Any, ...]] = []
+        for line, record in ProductImportService._read_records(
+            file, import_format
+        ):
+            if isinstance(record, str):
+                reject(line, record)
+                continue
+            try:
+                row = ProductImportRow.model_validate(record)
+            except ValidationError as exc:
+                reject(line, ProductImportService._format_errors(exc))
+                continue
+            batch.append(
+                (
+                    line,
+                    row.sku,
+                    row.name,
+                    row.description,
+                    row.image_url,
+                    row.price,
+                    row.stock,
+                    row.category,
+                )
+            )
+            if len(batch) >= settings.product_import_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _read_records(
+        file: IO[bytes], import_format: FeedFormat
+    ) -> Iterator[tuple[int, dict[str, Any] | str]]:
+        """Yield ``(line, record)`` pairs, or ``(line, error)`` if unparsable.
+
+        Lines are numbered from 1; for CSV the header is line 1.
+        """
+        stream = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        try:
+            if import_format == "csv":
+                reader = csv.DictReader(stream)
+                for record in reader:
+                    yield reader.line_num, record
+                return
+            for line, raw in enumerate(stream, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    yield line, "Invalid JSON"
+                    continue
+                if not isinstance(record, dict):
+                    yield line, "Expected a JSON object"
+                    continue
+                yield line, record
+        except UnicodeDecodeError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="File must be UTF-8 encoded",
+            ) from exc
+        finally:
+            stream.detach()
+
+    @staticmethod
+    def _format_errors(exc: ValidationError) -> str:
+        return "; ".join(
+            f"{'.'.join(str(p) for p in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )
@@ -1,17 +1,559 @@
-from sqlalchemy import func, select
+import base64
+import datetime
+import decimal
+import functools
+import json
+import operator
+import re
+import uuid
+from typing import Any, Sequence, cast
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    ColumnElement,
+    Integer,
+    RowMapping,
+    Select,
+    Uuid,
+    and_,
+    any_,
+    bindparam,
+    case,
+    func,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import (
+    InstrumentedAttribute,
+    aliased,
+    contains_eager,
+    joinedload,
+)
+
+from app.config import get_settings
+from app.db import SEARCH_CONFIG, Category, Product
+from app.fields import FieldSet, load_options
+from app.schemas import (
+    CategoryFacet,
+    PriceBucketFacet,
+    ProductFacets,
+    ProductFilters,
+    ProductPage,
+    ProductSort,
+    StockAdjustment,
+    StockLevel,
+)
+
+settings = get_settings()
 
-from app.db import Product
+SORT_KEYS: dict[
+    ProductSort | None, tuple[tuple[InstrumentedAttribute[Any], ...], bool]
+] = {
+    None: ((Product.created_at, Product.id), False),
+    "newest": ((Product.created_at, Product.id), True),
+    "price_asc": ((Product.price, Product.id), False),
+    "price_desc": ((Product.price, Product.id), True),
+}
+LOW_STOCK_CURSOR = "low_stock"
+MAX_STOCK = 2**31 - 1
+CURSOR_PARSERS = {
+    datetime.datetime: datetime.datetime.fromisoformat,
+    decimal.Decimal: decimal.Decimal,
+    int: int,
+    uuid.UUID: uuid.UUID,
+}
 
 
 class ProductsService:
 
+    @staticmethod
+    async def get_products(
+        session: AsyncSession,
+        filters: ProductFilters,
+        fields: FieldSet | None = None,
+    ) -> Sequence[Product]:
+        options = load_options(
+            Product, fields, {"category": joinedload(Product.category)}
+        )
+        query = ProductsService._filter_products(
+            select(Product).options(*options), filters
+        )
+        if filters.sort is not None:
+            sort_columns, descending = SORT_KEYS[filters.sort]
+            query = query.order_by(
+                *(c.desc() if descending else c for c in sort_columns)
+            )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @staticmethod
+    async def get_products_by_ids(
+        session: AsyncSession, product_ids: list[uuid.UUID]
+    ) -> Sequence[Product]:
+        # ``= ANY(array)`` binds a single parameter, so the statement is the
+        # same (and cacheable) whatever the number of ids.
+        query = (
+            select(Product)
+            .options(joinedload(Product.category))
+            .where(
+                Product.id
+                == any_(bindparam("product_ids", product_ids, ARRAY(Uuid)))
+            )
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @staticmethod
+    async def get_products_page(
+        session: AsyncSession,
+        filters: ProductFilters,
+        limit: int,
+        cursor: str | None = None,
+    ) -> ProductPage:
+        """Return a page of products using keyset pagination.
+
+        Products are ordered by the sort key for ``filters.sort`` (``id`` is
+        always the tie-breaker) and the cursor encodes that key for the last
+        row of the previous page, so every page is an index range scan
+        regardless of how deep the client has paged.
+        """
+        sort_columns, descending = SORT_KEYS[filters.sort]
+        query = (
+            ProductsService._filter_products(
+                select(Product).options(joinedload(Product.category)),
+                filters,
+            )
+            .order_by(*(c.desc() if descending else c for c in sort_columns))
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            key = tuple_(*sort_columns)
+            after = ProductsService.decode_cursor(
+                cursor, filters.sort, sort_columns
+            )
+            query = query.where(key < after if descending else key > after)
+        result = await session.execute(query)
+        products = list(result.scalars().all())
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = ProductsService.encode_cursor(
+                filters.sort,
+                [getattr(last, c.key) for c in sort_columns],
+            )
+        return ProductPage.model_validate(
+            {"items": products, "next_cursor": next_cursor},
+            from_attributes=True,
+        )
+
+    @staticmethod
+    def _filter_products(
+        query: Select[tuple[Product]], filters: ProductFilters
+    ) -> Select[tuple[Product]]:
+        return query.where(*ProductsService._filter_conditions(filters))
+
+    @staticmethod
+    def _filter_conditions(
+        filters: ProductFilters, exclude: frozenset[str] = frozenset()
+    ) -> list[ColumnElement[bool]]:
+        """SQL conditions for ``filters``, skipping the facets in ``exclude``.
+
+        Facets are ``"category"``, ``"price"`` and ``"in_stock"``.
+        """
+        conditions: list[ColumnElement[bool]] = []
+        if filters.category_id is not None and "category" not in exclude:
+            conditions.append(Product.category_id == filters.category_id)
+        if "price" not in exclude:
+            if filters.min_price is not None:
+                conditions.append(Product.price >= filters.min_price)
+            if filters.max_price is not None:
+                conditions.append(Product.price <= filters.max_price)
+        if filters.in_stock and "in_stock" not in exclude:
+            conditions.append(Product.stock > 0)
+        return conditions
+
+    @staticmethod
+    async def get_product_facets(
+        session: AsyncSession,
+        filters: ProductFilters,
+        price_buckets: Sequence[decimal.Decimal],
+    ) -> ProductFacets:
+        """Sidebar facet counts for ``filters`` in one grouped aggregate.
+
+        ``GROUPING SETS`` yields one row per category, one per price bucket
+        and a grand total from a single scan. Each facet is counted with a
+        ``FILTER`` that applies every active filter except its own, so
+        selecting a category still shows the counts of the other categories.
+        ``price_buckets`` are the ascending bucket boundaries.
+        """
+
+        def matching(*exclude: str) -> ColumnElement[bool]:
+            return and_(
+                true(),
+                *ProductsService._filter_conditions(
+                    filters, frozenset(exclude)
+                ),
+            )
+
+        bucket = case(
+            *(
+                (Product.price < boundary, index)
+                for index, boundary in enumerate(price_buckets)
+            ),
+            else_=len(price_buckets),
+        )
+        query = select(
+            func.grouping(Product.category_id).label("by_category"),
+            func.grouping(bucket).label("by_bucket"),
+            Product.category_id,
+            bucket.label("bucket"),
+            func.count().filter(matching("category")).label("category_count"),
+            func.count().filter(matching("price")).label("bucket_count"),
+            func.count()
+            .filter(and_(matching("in_stock"), Product.stock > 0))
+            .label("in_stock_count"),
+            func.count().filter(matching()).label("total"),
+        ).group_by(
+            func.grouping_sets(
+                tuple_(Product.category_id), tuple_(bucket), tuple_()
+            )
+        )
+        result = await session.execute(query)
+        total = in_stock = 0
+        categories: list[CategoryFacet] = []
+        bucket_counts = [0] * (len(price_buckets) + 1)
+        for row in result:
+            if not row.by_category:
+                if row.category_count:
+                    categories.append(
+                        CategoryFacet(
+                            category_id=row.category_id,
+                            count=row.category_count,
+                        )
+                    )
+            elif not row.by_bucket:
+                bucket_counts[row.bucket] = row.bucket_count
+            else:
+                total, in_stock = row.total, row.in_stock_count
+        categories.sort(key=lambda c: (-c.count, str(c.category_id)))
+        bounds = [None, *price_buckets, None]
+        return ProductFacets(
+            total=total,
+            in_stock=in_stock,
+            categories=categories,
+            price_buckets=[
+                PriceBucketFacet(
+                    min_price=bounds[index],
+                    max_price=bounds[index + 1],
+                    count=count,
+                )
+                for index, count in enumerate(bucket_counts)
+            ],
+        )
+
+    @staticmethod
+    async def search_products(
+        session: AsyncSession, q: str, limit: int
+    ) -> Sequence[Product]:
+        """Full-text search over product names and descriptions.
+
+        On PostgreSQL this matches against the GIN-indexed ``search_vector``
+        column and orders by ``ts_rank``. Other dialects fall back to
+        ``_search_products_fallback``.
+        """
+        if session.bind.dialect.name != "postgresql":
+            return await ProductsService._search_products_fallback(
+                session, q, limit
+            )
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        rank = func.ts_rank(Product.search_vector, ts_query)
+        query = (
+            select(Product)
+            .options(joinedload(Product.category))
+            .where(Product.search_vector.bool_op("@@")(ts_query))
+            .order_by(rank.desc(), Product.id)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @staticmethod
+    async def _search_products_fallback(
+        session: AsyncSession, q: str, limit: int
+    ) -> Sequence[Product]:
+        # Approximates the weighted tsvector ranking: name hits count more
+        # than description hits. Only used where full-text search is not
+        # available, e.g. SQLite.
+        terms = re.findall(r"\w+", q.lower())
+        if not terms:
+            return []
+        conditions = []
+        scores = []
+        for term in terms:
+            in_name = Product.name.icontains(term, autoescape=True)
+            in_description = Product.description.icontains(
+                term, autoescape=True
+            )
+            conditions.extend([in_name, in_description])
+            scores.append(case((in_name, 1.0), else_=0.0))
+            scores.append(case((in_description, 0.4), else_=0.0))
+        score = functools.reduce(operator.add, scores)
+        result = await session.execute(
+            select(Product)
+            .options(joinedload(Product.category))
+            .where(or_(*conditions))
+            .order_by(score.desc(), Product.id)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    async def suggest_products(
+        session: AsyncSession, q: str, limit: int
+    ) -> Sequence[RowMapping]:
+        """Typeahead suggestions for product names.
+
+        Only ``id`` and ``name`` are selected so no ``Product`` instances are
+        built. Prefix matches come first, then fuzzy matches ranked by
+        trigram word similarity; both use the ``gin_trgm_ops`` index on
+        PostgreSQL.
+        """
+        conditions = [Product.name.icontains(q, autoescape=True)]
+        order_by = [Product.name.istartswith(q, autoescape=True).desc()]
+        if session.bind.dialect.name == "postgresql":
+            conditions.append(Product.name.bool_op("%>")(q))
+            order_by.append(func.word_similarity(q, Product.name).desc())
+        query = (
+            select(Product.id, Product.name)
+            .where(or_(*conditions))
+            .order_by(*order_by, Product.name)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return result.mappings().all()
+
+    @staticmethod
+    def encode_cursor(sort: str | None, values: list[Any]) -> str:
+        payload = json.dumps([sort, [str(v) for v in values]])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(
+        cursor: str,
+        sort: str | None,
+        columns: tuple[InstrumentedAttribute[Any], ...],
+    ) -> tuple[Any, ...]:
+        try:
+            cursor_sort, values = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+            if (
+                cursor_sort != sort
+                or not isinstance(values, list)
+                or len(values) != len(columns)
+            ):
+                raise ValueError("Cursor does not match the requested sort")
+            return tuple(
+                ProductsService._parse_cursor_value(c, v)
+                for c, v in zip(columns, values)
+            )
+        except Exception as exc:
+            # Cursors come from clients, so any malformed one is a 400.
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            ) from exc
+
+    @staticmethod
+    def _parse_cursor_value(
+        column: InstrumentedAttribute[Any], value: Any
+    ) -> Any:
+        if not isinstance(value, str):
+            raise ValueError("Cursor values must be strings")
+        parsed = CURSOR_PARSERS[column.type.python_type](value)
+        # Timestamp columns are naive UTC.
+        if isinstance(parsed, datetime.datetime) and parsed.tzinfo is not None:
+            raise ValueError("Cursor timestamps must be naive")
+        # Values beyond the column's range would overflow in PostgreSQL.
+        if isinstance(parsed, decimal.Decimal):
+            integer_digits = column.type.precision - column.type.scale
+            if not parsed.is_finite() or abs(parsed) >= 10**integer_digits:
+                raise ValueError("Cursor value out of range")
+        if isinstance(parsed, int) and not -(2**31) <= parsed < 2**31:
+            raise ValueError("Cursor value out of range")
+        return parsed
+
+    @staticmethod
+    def _low_stock_condition() -> ColumnElement[bool]:
+        # Products must be joined to their category. The per-row threshold
+        # cannot drive an index scan, so the stock is also bounded by the
+        # highest threshold in use, an uncorrelated subquery that Postgres
+        # evaluates once and uses as the upper end of ix_products_stock_id.
+        threshold = func.coalesce(
+            Category.low_stock_threshold, settings.low_stock_threshold
+        )
+        categories = aliased(Category)
+        max_threshold = (
+            select(
+                func.greatest(
+                    func.max(categories.low_stock_threshold),
+                    settings.low_stock_threshold,
+                )
+            )
+            .correlate(None)
+            .scalar_subquery()
+        )
+        return and_(Product.stock < max_threshold, Product.stock < threshold)
+
+    @staticmethod
+    async def get_low_stock_products_page(
+        session: AsyncSession, limit: int, cursor: str | None = None
+    ) -> ProductPage:
+        """Products below their category's (or the global) low-stock
+        threshold, lowest stock first, with keyset pagination.
+
+        Scans ``ix_products_stock_id`` up to the highest threshold in use,
+        so only products below it are ever read.
+        """
+        sort_columns = (Product.stock, Product.id)
+        query = (
+            select(Product)
+            .join(Product.category)
+            .options(contains_eager(Product.category))
+            .where(ProductsService._low_stock_condition())
+            .order_by(*sort_columns)
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            after = ProductsService.decode_cursor(
+                cursor, LOW_STOCK_CURSOR, sort_columns
+            )
+            query = query.where(tuple_(*sort_columns) > after)
+        result = await session.execute(query)
+        products = list(result.scalars().all())
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = ProductsService.encode_cursor(
+                LOW_STOCK_CURSOR, [last.stock, last.id]
+            )
+        return ProductPage.model_validate(
+            {"items": products, "next_cursor": next_cursor},
+            from_attributes=True,
+        )
+
     @staticmethod
     async def get_low_stock_products_count(
         session: AsyncSession,
     ) -> dict[str, int]:
         query = (
-            select(func.count()).select_from(Product).where(Product.stock < 30)
+            select(func.count())
+            .select_from(Product)
+            .join(Product.category)
+            .where(ProductsService._low_stock_condition())
         )
         result = await session.execute(query)
         return {"count": result.scalar() or 0}
+
+    @staticmethod
+    async def adjust_stock(
+        session: AsyncSession, adjustments: Sequence[StockAdjustment]
+    ) -> list[StockLevel]:
+        """Apply stock adjustments with a single ``UPDATE ... FROM unnest``.
+
+        Adjustments for the same product are folded in order into one
+        ``coalesce(absolute, stock) + delta``, computed as ``bigint``. The
+        range check is made on the locked rows inside the same statement, so
+        it holds under concurrent writers, and if any product is unknown or
+        would leave the ``integer`` range nothing is written. The caller
+        commits.
+        """
+        folded: dict[uuid.UUID, tuple[int | None, int]] = {}
+        for adjustment in adjustments:
+            absolute, delta = folded.get(adjustment.product_id, (None, 0))
+            if adjustment.absolute is not None:
+                absolute, delta = adjustment.absolute, 0
+            else:
+                delta += cast(int, adjustment.delta)
+            folded[adjustment.product_id] = (absolute, delta)
+
+        # ``locked`` takes the row locks first, in id order so concurrent
+        # batches cannot deadlock, and computes the new stock from the latest
+        # committed values; ``updated`` only writes if every product exists
+        # and every new stock fits the column.
+        query = text(
+            "WITH v AS ("
+            "SELECT * FROM unnest(CAST(:product_ids AS uuid[]), "
+            "CAST(:absolutes AS integer[]), CAST(:deltas AS bigint[])) "
+            "AS v(product_id, absolute, delta)), "
+            "locked AS ("
+            "SELECT p.id, "
+            "coalesce(v.absolute, p.stock)::bigint + v.delta AS stock "
+            "FROM v JOIN products p ON p.id = v.product_id "
+            "ORDER BY p.id FOR UPDATE OF p), "
+            "updated AS ("
+            "UPDATE products p SET stock = l.stock FROM locked l "
+            "WHERE p.id = l.id "
+            "AND NOT EXISTS (SELECT FROM locked "
+            "WHERE stock NOT BETWEEN 0 AND :max_stock) "
+            "AND (SELECT count(*) FROM locked) = (SELECT count(*) FROM v) "
+            "RETURNING p.id, p.sku, p.stock) "
+            "SELECT v.product_id, l.stock AS requested, u.sku, u.stock "
+            "FROM v LEFT JOIN locked l ON l.id = v.product_id "
+            "LEFT JOIN updated u ON u.id = v.product_id"
+        ).bindparams(
+            bindparam("product_ids", list(folded), ARRAY(Uuid)),
+            bindparam(
+                "absolutes", [a for a, _ in folded.values()], ARRAY(Integer)
+            ),
+            bindparam(
+                "deltas", [d for _, d in folded.values()], ARRAY(BigInteger)
+            ),
+            bindparam("max_stock", MAX_STOCK, BigInteger),
+        )
+        result = await session.execute(query)
+        levels: dict[uuid.UUID, StockLevel] = {}
+        unknown: list[str] = []
+        insufficient: list[str] = []
+        overflowing: list[str] = []
+        for row in result:
+            if row.requested is None:
+                unknown.append(str(row.product_id))
+            elif row.requested < 0:
+                insufficient.append(str(row.product_id))
+            elif row.requested > MAX_STOCK:
+                overflowing.append(str(row.product_id))
+            elif row.stock is not None:
+                levels[row.product_id] = StockLevel(
+                    product_id=row.product_id, sku=row.sku, stock=row.stock
+                )
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=f"Unknown products: {', '.join(sorted(unknown))}",
+            )
+        if insufficient:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=(
+                    "Stock would go negative for products: "
+                    f"{', '.join(sorted(insufficient))}"
+                ),
+            )
+        if overflowing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=(
+                    "Stock would exceed the maximum for products: "
+                    f"{', '.join(sorted(overflowing))}"
+                ),
+            )
+        return [levels[product_id] for product_id in folded]
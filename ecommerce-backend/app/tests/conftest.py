@@ -15,6 +15,7 @@ from sqlalchemy.pool import NullPool
 
 load_dotenv(".env.test", override=True)
 
+from app.cache import catalog_cache  # noqa: E402
 from app.db import (  # noqa: E402
     DATABASE_URL,
     Base,
@@ -41,6 +42,7 @@ TestingSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 async def prepare_database():
     """Create tables before each test and drop them after."""
     yield
+    catalog_cache.clear()
     async with engine.begin() as conn:
         for tbl in reversed(Base.metadata.sorted_tables):
             await conn.execute(tbl.delete())
@@ -63,6 +65,12 @@ async def session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+@pytest.fixture
+def session_maker() -> async_sessionmaker[AsyncSession]:
+    """Independent sessions, e.g. to simulate concurrent requests."""
+    return TestingSessionLocal
+
+
 @pytest_asyncio.fixture(scope="function")
 async def client(session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     """Provide an authenticated AsyncClient."""
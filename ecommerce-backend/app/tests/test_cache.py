@@ -0,0 +1,161 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache, catalog_cache
+from app.db import Category, Product
+
+
+def test_ttl_cache_hit_and_miss():
+    cache: TTLCache[str] = TTLCache(max_size=2, ttl=60)
+    assert cache.get(("a",)) is None
+    cache.set(("a",), "value")
+    assert cache.get(("a",)) == "value"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "size": 1,
+        "max_size": 2,
+        "bytes": 0,
+        "max_bytes": None,
+    }
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[int] = TTLCache(max_size=2, ttl=60)
+    cache.set(("a",), 1)
+    cache.set(("b",), 2)
+    cache.get(("a",))
+    cache.set(("c",), 3)
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == 1
+    assert cache.get(("c",)) == 3
+
+
+def test_ttl_cache_evicts_by_size():
+    cache: TTLCache[bytes] = TTLCache(
+        max_size=10, ttl=60, max_bytes=10, weigh=len
+    )
+    cache.set(("a",), b"1234")
+    cache.set(("b",), b"1234")
+    cache.set(("c",), b"1234")
+    assert cache.get(("a",)) is None
+    assert cache.stats()["bytes"] == 8
+    cache.set(("d",), b"12345678901")
+    assert cache.get(("d",)) is None
+    cache.set(("b",), b"1")
+    assert cache.stats()["bytes"] == 5
+    cache.invalidate_namespace("c")
+    assert cache.stats()["bytes"] == 1
+
+
+def test_ttl_cache_skips_fill_after_invalidation():
+    cache: TTLCache[int] = TTLCache(max_size=10, ttl=60)
+    generation = cache.generation("product")
+    cache.invalidate(("product", "a"))
+    cache.set(("product", "a"), 1, generation)
+    assert cache.get(("product", "a")) is None
+
+    generation = cache.generation("product")
+    cache.invalidate_namespace("products")
+    cache.set(("product", "a"), 1, generation)
+    assert cache.get(("product", "a")) == 1
+
+    generation = cache.generation("product")
+    cache.clear()
+    cache.set(("product", "a"), 2, generation)
+    assert cache.get(("product", "a")) is None
+
+
+def test_ttl_cache_expires_entries(monkeypatch: pytest.MonkeyPatch):
+    cache: TTLCache[int] = TTLCache(max_size=2, ttl=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.set(("a",), 1)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(("a",)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_ttl_cache_invalidate_namespace():
+    cache: TTLCache[int] = TTLCache(max_size=10, ttl=60)
+    cache.set(("products", "x"), 1)
+    cache.set(("products", "y"), 2)
+    cache.set(("product", "z"), 3)
+    cache.invalidate_namespace("products")
+    assert cache.get(("products", "x")) is None
+    assert cache.get(("products", "y")) is None
+    assert cache.get(("product", "z")) == 3
+
+
+@pytest.mark.asyncio
+async def test_read_product_is_cached(
+    client: AsyncClient, product: Product, session: AsyncSession
+):
+    response = await client.get(f"/products/{product.id}")
+    assert response.status_code == 200
+    product.name = "Changed behind the cache"
+    await session.commit()
+    hits = catalog_cache.hits
+    response = await client.get(f"/products/{product.id}")
+    assert response.json()["name"] == "Test Product"
+    assert catalog_cache.hits == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_update_product_invalidates_cache(
+    auth_client: AsyncClient, product: Product
+):
+    await auth_client.get(f"/products/{product.id}")
+    await auth_client.get("/products/")
+    response = await auth_client.patch(
+        f"/products/{product.id}", json={"name": "Updated Product"}
+    )
+    assert response.status_code == 200
+    response = await auth_client.get(f"/products/{product.id}")
+    assert response.json()["name"] == "Updated Product"
+    response = await auth_client.get("/products/")
+    assert response.json()[0]["name"] == "Updated Product"
+
+
+@pytest.mark.asyncio
+async def test_create_product_invalidates_listing(
+    auth_client: AsyncClient, category: Category
+):
+    response = await auth_client.get("/products/")
+    assert response.json() == []
+    await auth_client.post(
+        "/products/",
+        json={
+            "name": "Test Product",
+            "description": "A test product",
+            "image_url": "http://example.com/image.png",
+            "price": 10.99,
+            "stock": 100,
+            "category_id": str(category.id),
+        },
+    )
+    response = await auth_client.get("/products/")
+    assert len(response.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_stats(auth_client: AsyncClient):
+    response = await auth_client.get("/health/cache")
+    assert response.status_code == 200
+    assert set(response.json()) == {
+        "hits",
+        "misses",
+        "size",
+        "max_size",
+        "bytes",
+        "max_bytes",
+    }
+
+
+@pytest.mark.asyncio
+async def test_cache_stats_unauthorized(client: AsyncClient):
+    response = await client.get("/health/cache")
+    assert response.status_code == 401
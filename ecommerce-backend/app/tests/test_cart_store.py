@@ -0,0 +1,263 @@
+import asyncio
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cart_store import get_cart_store, kv
+from app.cart_store.base import ItemChange
+from app.cart_store.kv import (
+    InMemoryKeyValue,
+    KeyValueCartStore,
+    create_key_value_client,
+)
+from app.db import Cart, Order, Product, User
+from app.main import app
+
+
+@pytest.fixture
+def store(session: AsyncSession) -> KeyValueCartStore:
+    return KeyValueCartStore(InMemoryKeyValue(), ttl=60, session=session)
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_items(store: KeyValueCartStore):
+    cart = await store.create({"a": 1})
+    assert (await store.get(cart.id)).items == {"a": 1}
+
+    cart = await store.add_item(cart.id, "a", 2, max_quantity=5)
+    assert cart.items == {"a": 3}
+    assert await store.add_item(cart.id, "a", 3, max_quantity=5) is None
+    assert await store.add_item(cart.id, "b", 9, max_quantity=5) is None
+    assert (await store.get(cart.id)).items == {"a": 3}
+
+    cart = await store.merge_items(cart.id, {"b": 2})
+    assert cart.items == {"a": 3, "b": 2}
+    assert (await store.set_item(cart.id, "b", 4)).items == {"a": 3, "b": 4}
+    assert await store.set_item(cart.id, "c", 1) is None
+    assert (await store.remove_item(cart.id, "a")).items == {"b": 4}
+    assert await store.get(cart.id + 1) is None
+    assert await store.remove_item(cart.id + 1, "a") is None
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_apply_changes(store: KeyValueCartStore):
+    cart = await store.create({"a": 1, "b": 2})
+    changes = {
+        "a": ItemChange(delta=2, max_quantity=3),
+        "b": ItemChange(absolute=0),
+        "c": ItemChange(absolute=1, delta=1, max_quantity=5),
+    }
+    cart = await store.apply_changes(cart.id, changes)
+    assert cart.items == {"a": 3, "c": 2}
+
+    changes = {
+        "c": ItemChange(delta=1, max_quantity=5),
+        "a": ItemChange(delta=1, max_quantity=3),
+    }
+    assert await store.apply_changes(cart.id, changes) is None
+    changes = {"a": ItemChange(absolute=9, max_quantity=3)}
+    assert await store.apply_changes(cart.id, changes) is None
+    assert (await store.get(cart.id)).items == {"a": 3, "c": 2}
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_versions(store: KeyValueCartStore):
+    cart = await store.create({"a": 1})
+    assert cart.version == 1
+    cart = await store.add_item(cart.id, "a", 1, max_quantity=5, version=1)
+    assert cart.version == 2
+    assert await store.add_item(cart.id, "a", 1, 5, version=1) is None
+    # A change rejected on its own precondition keeps the version.
+    assert await store.add_item(cart.id, "a", 9, 5, version=2) is None
+    assert await store.set_item(cart.id, "b", 1, version=2) is None
+    cart = await store.get(cart.id)
+    assert (cart.items, cart.version) == ({"a": 2}, 2)
+    changes = {"a": ItemChange(delta=1, max_quantity=5)}
+    assert await store.apply_changes(cart.id, changes, version=1) is None
+    assert (await store.get(cart.id)).items == {"a": 2}
+    cart = await store.apply_changes(cart.id, changes, version=2)
+    assert (cart.items, cart.version) == ({"a": 3}, 3)
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_totals(
+    store: KeyValueCartStore, product: Product, session: AsyncSession
+):
+    cart = await store.create({str(product.id): 2})
+    totals = await store.get_totals(session, cart.id)
+    assert totals.total_items_count == 2
+    assert totals.subtotal == product.price * 2
+    assert await store.get_totals(session, cart.id + 1) is None
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_persists_on_attach(
+    store: KeyValueCartStore,
+    super_user: User,
+    product: Product,
+    session: AsyncSession,
+):
+    product_id = str(product.id)
+    cart = await store.create({product_id: 1})
+    merged = await store.merge_into_user(cart.id, super_user.id)
+    assert (merged.id, merged.user_id) == (cart.id, super_user.id)
+    assert merged.items == {product_id: 1}
+    assert await store.client.exists(f"cart:{cart.id}") == 0
+    persisted = await session.get(Cart, cart.id)
+    assert persisted.user_id == super_user.id
+
+    # The cart is now served from PostgreSQL under the same id.
+    cart = await store.add_item(cart.id, product_id, 1, max_quantity=5)
+    assert cart.items == {product_id: 2}
+    assert (await store.get(cart.id)).user_id == super_user.id
+    assert await store.merge_into_user(cart.id, super_user.id) is None
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_merges_into_user_cart(
+    store: KeyValueCartStore,
+    super_user: User,
+    session: AsyncSession,
+    create_product,
+    category,
+):
+    shared = await create_product("Shared", category, stock=5)
+    own = await create_product("Own", category)
+    user_cart = await store.create(
+        {str(shared.id): 2, str(own.id): 1}, super_user.id
+    )
+    cart = await store.create({str(shared.id): 4, str(uuid.uuid4()): 1})
+
+    merged = await store.merge_into_user(cart.id, super_user.id)
+    assert merged.id == user_cart.id
+    assert merged.items == {str(shared.id): 5, str(own.id): 1}
+    assert await store.get(cart.id) is None
+    result = await session.execute(
+        select(Cart.id).where(Cart.user_id == super_user.id, Cart.is_active)
+    )
+    assert result.scalars().all() == [user_cart.id]
+    assert await store.merge_into_user(cart.id, super_user.id) is None
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_merges_once(
+    super_user: User, product: Product, session_maker
+):
+    client = InMemoryKeyValue()
+    async with session_maker() as session:
+        cart = await KeyValueCartStore(client, 60, session).create(
+            {str(product.id): 1}
+        )
+        await session.commit()
+
+    async def merge():
+        async with session_maker() as session:
+            store = KeyValueCartStore(client, 60, session)
+            merged = await store.merge_into_user(cart.id, super_user.id)
+            await session.commit()
+            return merged
+
+    results = await asyncio.gather(merge(), merge())
+    assert sorted(merged is None for merged in results) == [False, True]
+    async with session_maker() as session:
+        stored = await session.get(Cart, cart.id)
+        assert stored.user_id == super_user.id
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_created_for_user_is_persisted(
+    store: KeyValueCartStore, super_user: User, session: AsyncSession
+):
+    cart = await store.create({"a": 1}, super_user.id)
+    assert await store.client.exists(f"cart:{cart.id}") == 0
+    assert (await session.get(Cart, cart.id)).user_id == super_user.id
+
+
+def test_memory_key_value_client_refuses_many_workers(monkeypatch):
+    monkeypatch.setattr(kv.settings, "cart_store", "memory")
+    monkeypatch.setattr(kv.settings, "web_concurrency", 2)
+    with pytest.raises(RuntimeError):
+        create_key_value_client()
+    monkeypatch.setattr(kv.settings, "web_concurrency", 1)
+    assert isinstance(create_key_value_client(), InMemoryKeyValue)
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_expires(session: AsyncSession):
+    store = KeyValueCartStore(InMemoryKeyValue(), ttl=0, session=session)
+    cart = await store.create({"a": 1})
+    await asyncio.sleep(0.01)
+    assert await store.get(cart.id) is None
+    assert await store.add_item(cart.id, "a", 1, max_quantity=5) is None
+
+
+@pytest.mark.asyncio
+async def test_checkout_from_key_value_store(
+    auth_client: AsyncClient,
+    store: KeyValueCartStore,
+    product: Product,
+    session: AsyncSession,
+    super_user: User,
+):
+    app.dependency_overrides[get_cart_store] = lambda: store
+    response = await auth_client.post("/carts")
+    cart_id = int(response.json())
+    response = await auth_client.post(
+        f"/carts/{cart_id}/items/",
+        json={"product_id": str(product.id), "quantity": 2},
+        headers={"If-Match": '"1"'},
+    )
+    assert response.status_code == 200
+    assert response.json()["items"][0]["quantity"] == 2
+    # Nothing reaches PostgreSQL before checkout.
+    result = await session.execute(select(Cart))
+    assert result.scalars().all() == []
+
+    response = await auth_client.post(
+        f"/carts/{cart_id}/orders/",
+        json={"shipping_address": "123 Main St, Anytown, USA"},
+    )
+    assert response.status_code == 201
+    assert await store.get(cart_id) is None
+    result = await session.execute(select(Cart))
+    archived = result.scalar_one()
+    assert archived.id == cart_id
+    assert archived.items == {str(product.id): 2}
+    assert not archived.is_active
+    result = await session.execute(select(Order))
+    assert result.scalar_one().user_id == super_user.id
+
+
+@pytest.mark.asyncio
+async def test_key_value_checkout_shortfall_keeps_cart(
+    auth_client: AsyncClient,
+    store: KeyValueCartStore,
+    create_product,
+    category,
+):
+    product = await create_product("Scarce", category, stock=1)
+    app.dependency_overrides[get_cart_store] = lambda: store
+    cart = await store.create({str(product.id): 2})
+    response = await auth_client.post(
+        f"/carts/{cart.id}/orders/",
+        json={"shipping_address": "123 Main St, Anytown, USA"},
+    )
+    assert response.status_code == 400
+    assert await store.get(cart.id) == cart
+
+
+@pytest.mark.asyncio
+async def test_key_value_cart_store_checks_out_once(
+    store: KeyValueCartStore, session: AsyncSession
+):
+    cart = await store.create({"a": 1})
+    stale = await store.get(cart.id)
+    await store.add_item(cart.id, "a", 1, max_quantity=5)
+    assert not await store.check_out(session, stale)
+    cart = await store.get(cart.id)
+    assert await store.check_out(session, cart)
+    assert not await store.check_out(session, cart)
+    await session.rollback()
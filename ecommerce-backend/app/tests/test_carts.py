@@ -1,16 +1,35 @@
+import asyncio
+import contextlib
+import datetime
 import uuid
+from collections.abc import Iterator
 
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+from sqlalchemy import event, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cart_store.sql import SqlCartStore
+from app.cart_sweeper import sweep_expired_carts
 from app.db import Cart, Product, User
+from app.loaders import ProductLoader
 from app.main import app
+from app.schemas import CartItemOperation, CartPatch
+from app.services.carts import CartService
 
 client = TestClient(app)
 
 
+def if_match(cart: Cart) -> dict[str, str]:
+    return {"If-Match": f'"{cart.version}"'}
+
+
+def cart_token(cart: Cart) -> dict[str, str]:
+    return {"X-Cart-Token": CartService.cart_token(cart.id)}
+
+
 @pytest.mark.asyncio
 async def test_create_cart(session: AsyncSession, super_user: User):
     product_id = str(uuid.uuid4())
@@ -28,6 +47,8 @@ async def test_create_cart_router(client: AsyncClient):
     response = await client.post("/carts")
     assert response.status_code == 201
     assert type(response.json()) == str
+    cart_id = int(response.json())
+    assert response.headers["X-Cart-Token"] == CartService.cart_token(cart_id)
 
 
 @pytest.mark.asyncio
@@ -35,7 +56,9 @@ async def test_update_cart_router(
     client: AsyncClient, cart: Cart, product: Product
 ):
     response = await client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 1}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 1}},
+        headers=if_match(cart),
     )
     print(response.json())
     assert response.status_code == 200
@@ -50,14 +73,18 @@ async def test_update_cart_router(
 async def test_update_cart_router_invalid_cart(
     client: AsyncClient, cart: Cart, session: AsyncSession
 ):
-    response = await client.put("/carts/0", json={"items": {}})
+    response = await client.put(
+        "/carts/0", json={"items": {}}, headers={"If-Match": '"1"'}
+    )
     print(response.json())
     assert response.status_code == 404
     assert response.json() == {"detail": "Cart not found"}
     cart.is_active = False
     session.add(cart)
     await session.commit()
-    response = await client.put(f"/carts/{cart.id}", json={"items": {}})
+    response = await client.put(
+        f"/carts/{cart.id}", json={"items": {}}, headers=if_match(cart)
+    )
     assert response.status_code == 404
     assert response.json() == {"detail": "Cart not found"}
 
@@ -69,6 +96,7 @@ async def test_update_cart_product_invalid_stock(
     response = await client.put(
         f"/carts/{cart.id}",
         json={"items": {str(product.id): product.stock + 1}},
+        headers=if_match(cart),
     )
     assert response.status_code == 400
     assert response.json() == {
@@ -100,6 +128,7 @@ async def test_update_cart_product_invalid_quantity(
     response = await client.put(
         f"/carts/{cart.id}",
         json={"items": {str(product.id): -1}},
+        headers=if_match(cart),
     )
     assert response.status_code == 422
 
@@ -111,6 +140,7 @@ async def test_add_item_to_cart_router(
     response = await client.post(
         f"/carts/{cart.id}/items/",
         json={"product_id": str(product.id), "quantity": 2},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     data = response.json()
@@ -121,6 +151,7 @@ async def test_add_item_to_cart_router(
     response = await client.post(
         f"/carts/{cart.id}/items/",
         json={"product_id": str(product.id), "quantity": 1},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     data = response.json()
@@ -134,6 +165,7 @@ async def test_add_item_to_cart_router_insufficient_stock(
     response = await client.post(
         f"/carts/{cart.id}/items/",
         json={"product_id": str(product.id), "quantity": product.stock + 1},
+        headers=if_match(cart),
     )
     assert response.status_code == 400
     assert (
@@ -153,6 +185,7 @@ async def test_update_item_in_cart_router(
     response = await client.put(
         f"/carts/{cart.id}/items/{product.id}",
         json={"quantity": 5},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     data = response.json()
@@ -166,6 +199,7 @@ async def test_update_item_in_cart_router_not_in_cart(
     response = await client.put(
         f"/carts/{cart.id}/items/{product.id}",
         json={"quantity": 5},
+        headers=if_match(cart),
     )
     assert response.status_code == 404
     assert response.json()["detail"] == f"Product {product.id} not in cart"
@@ -179,7 +213,9 @@ async def test_remove_item_from_cart_router(
     session.add(cart)
     await session.commit()
 
-    response = await client.delete(f"/carts/{cart.id}/items/{product.id}")
+    response = await client.delete(
+        f"/carts/{cart.id}/items/{product.id}", headers=if_match(cart)
+    )
     assert response.status_code == 200
     data = response.json()
     product_ids = [item["product_id"] for item in data["items"]]
@@ -190,6 +226,476 @@ async def test_remove_item_from_cart_router(
 async def test_remove_item_from_cart_router_not_in_cart(
     client: AsyncClient, cart: Cart, product: Product
 ):
-    response = await client.delete(f"/carts/{cart.id}/items/{product.id}")
+    response = await client.delete(
+        f"/carts/{cart.id}/items/{product.id}", headers=if_match(cart)
+    )
     assert response.status_code == 200
     assert response.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_adds_do_not_lose_updates(
+    cart: Cart, create_product, category, session_maker
+):
+    first = await create_product("First", category)
+    second = await create_product("Second", category)
+
+    async def add(product: Product, quantity: int):
+        async with session_maker() as session:
+            await CartService.add_item_to_cart(
+                ProductLoader(session),
+                SqlCartStore(session),
+                cart.id,
+                str(product.id),
+                quantity,
+            )
+
+    await asyncio.gather(
+        add(first, 1), add(second, 2), add(first, 3), add(second, 4)
+    )
+    async with session_maker() as session:
+        stored = await session.get(Cart, cart.id)
+        assert stored.items == {str(first.id): 4, str(second.id): 6}
+
+
+@pytest.mark.asyncio
+async def test_cart_mutations_require_current_version(
+    client: AsyncClient, cart: Cart, product: Product
+):
+    response = await client.get(f"/carts/{cart.id}")
+    assert response.json()["version"] == 1
+    assert response.headers["ETag"] == '"1"'
+
+    item = {"product_id": str(product.id), "quantity": 1}
+    response = await client.put(f"/carts/{cart.id}", json={"items": {}})
+    assert response.status_code == 428
+    response = await client.post(
+        f"/carts/{cart.id}/items/", json=item, headers={"If-Match": "abc"}
+    )
+    assert response.status_code == 400
+
+    response = await client.post(
+        f"/carts/{cart.id}/items/", json=item, headers={"If-Match": '"1"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+
+    # A second tab still holding version 1 cannot overwrite the change.
+    for response in (
+        await client.put(
+            f"/carts/{cart.id}",
+            json={"items": {str(product.id): 5}},
+            headers={"If-Match": '"1"'},
+        ),
+        await client.delete(
+            f"/carts/{cart.id}/items/{product.id}",
+            headers={"If-Match": 'W/"1"'},
+        ),
+    ):
+        assert response.status_code == 409
+        assert response.json() == {
+            "detail": "Cart was modified; reload it and retry"
+        }
+    response = await client.get(f"/carts/{cart.id}")
+    assert response.json()["items"][0]["quantity"] == 1
+
+    # Adding is additive, so it may be sent without a version.
+    response = await client.post(f"/carts/{cart.id}/items/", json=item)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["quantity"] == 2
+    assert response.headers["ETag"] == '"3"'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_of_one_version_conflict(
+    cart: Cart, create_product, category, session_maker
+):
+    product = await create_product("Product", category)
+
+    async def add(quantity: int):
+        async with session_maker() as session:
+            try:
+                await CartService.add_item_to_cart(
+                    ProductLoader(session),
+                    SqlCartStore(session),
+                    cart.id,
+                    str(product.id),
+                    quantity,
+                    version=1,
+                )
+            except HTTPException as exc:
+                return exc.status_code
+            return 200
+
+    statuses = await asyncio.gather(add(1), add(2), add(3))
+    assert sorted(statuses) == [200, 409, 409]
+    async with session_maker() as session:
+        stored = await session.get(Cart, cart.id)
+        assert stored.version == 2
+        assert sum(stored.items.values()) in (1, 2, 3)
+
+
+@contextlib.contextmanager
+def product_queries(session: AsyncSession) -> Iterator[list[str]]:
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM products" in statement:
+            statements.append(statement)
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.mark.asyncio
+async def test_cart_mutations_cost_one_product_query(
+    client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    first = await create_product("First", category)
+    second = await create_product("Second", category)
+    added = await create_product("Added", category)
+    cart.items = {str(first.id): 1, str(second.id): 1}
+    await session.commit()
+
+    with product_queries(session) as statements:
+        response = await client.post(
+            f"/carts/{cart.id}/items/",
+            json={"product_id": str(added.id), "quantity": 1},
+            headers=if_match(cart),
+        )
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 3
+    assert len(statements) == 1
+
+    with product_queries(session) as statements:
+        await client.put(
+            f"/carts/{cart.id}/items/{first.id}",
+            json={"quantity": 2},
+            headers=if_match(cart),
+        )
+        await client.delete(
+            f"/carts/{cart.id}/items/{second.id}", headers=if_match(cart)
+        )
+    assert len(statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_product_loader_memoizes(
+    session: AsyncSession, create_product, category
+):
+    first = await create_product("First", category)
+    second = await create_product("Second", category)
+    missing = uuid.uuid4()
+    loader = ProductLoader(session)
+    with product_queries(session) as statements:
+        products = await loader.load_many([first.id, second.id, missing])
+        assert await loader.load(second.id) is products[second.id]
+        assert await loader.load_many([first.id, missing]) == {
+            first.id: products[first.id],
+            missing: None,
+        }
+    assert len(statements) == 1
+    assert products[first.id].id == first.id
+    assert products[missing] is None
+
+
+@pytest.mark.asyncio
+async def test_patch_cart(
+    client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    kept = await create_product("Kept", category)
+    added = await create_product("Added", category, stock=5)
+    removed = await create_product("Removed", category)
+    cart.items = {str(kept.id): 1, str(removed.id): 2}
+    await session.commit()
+
+    with product_queries(session) as statements:
+        response = await client.patch(
+            f"/carts/{cart.id}",
+            json={
+                "operations": [
+                    {"op": "add", "product_id": str(added.id), "quantity": 2},
+                    {"op": "remove", "product_id": str(removed.id)},
+                    {"op": "set", "product_id": str(kept.id), "quantity": 4},
+                    {"op": "add", "product_id": str(added.id), "quantity": 1},
+                ]
+            },
+            headers=if_match(cart),
+        )
+    assert response.status_code == 200
+    assert len(statements) == 1
+    quantities = {
+        item["product_id"]: item["quantity"]
+        for item in response.json()["items"]
+    }
+    assert quantities == {str(kept.id): 4, str(added.id): 3}
+    assert response.json()["summary"]["total_items_count"] == 7
+
+
+@pytest.mark.asyncio
+async def test_patch_cart_is_all_or_nothing(
+    client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    product = await create_product("Product", category, stock=5)
+    cart.items = {str(product.id): 1}
+    await session.commit()
+    response = await client.patch(
+        f"/carts/{cart.id}",
+        json={
+            "operations": [
+                {"op": "set", "product_id": str(product.id), "quantity": 2},
+                {"op": "add", "product_id": str(product.id), "quantity": 4},
+            ]
+        },
+        headers=if_match(cart),
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Not enough stock for product Product"
+    response = await client.patch(
+        f"/carts/{cart.id}",
+        json={
+            "operations": [
+                {"op": "remove", "product_id": str(product.id)},
+                {"op": "add", "product_id": str(uuid.uuid4()), "quantity": 1},
+            ]
+        },
+        headers=if_match(cart),
+    )
+    assert response.status_code == 404
+    response = await client.get(f"/carts/{cart.id}")
+    assert response.json()["items"][0]["quantity"] == 1
+
+
+@pytest.mark.asyncio
+async def test_patch_cart_validation(client: AsyncClient, cart: Cart):
+    product_id = str(uuid.uuid4())
+    for operation in (
+        {"op": "add", "product_id": product_id},
+        {"op": "remove", "product_id": product_id, "quantity": 1},
+        {"op": "set", "product_id": product_id, "quantity": 0},
+    ):
+        response = await client.patch(
+            f"/carts/{cart.id}",
+            json={"operations": [operation]},
+            headers=if_match(cart),
+        )
+        assert response.status_code == 422
+    response = await client.patch(
+        "/carts/0", json={"operations": []}, headers={"If-Match": '"1"'}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_concurrent_patches_do_not_lose_updates(
+    cart: Cart, create_product, category, session_maker
+):
+    product = await create_product("Product", category)
+
+    async def patch(quantity: int):
+        async with session_maker() as session:
+            await CartService.patch_cart(
+                ProductLoader(session),
+                SqlCartStore(session),
+                cart.id,
+                CartPatch(
+                    operations=[
+                        CartItemOperation(
+                            op="add", product_id=product.id, quantity=quantity
+                        )
+                    ]
+                ),
+            )
+
+    await asyncio.gather(patch(1), patch(2), patch(3))
+    async with session_maker() as session:
+        stored = await session.get(Cart, cart.id)
+        assert stored.items == {str(product.id): 6}
+
+
+@pytest.mark.asyncio
+async def test_sweep_expired_carts(
+    client: AsyncClient,
+    session: AsyncSession,
+    super_user: User,
+    product: Product,
+):
+    anonymous = [Cart(items={}) for _ in range(3)]
+    owned = Cart(user_id=super_user.id, items={})
+    checked_out = Cart(user_id=super_user.id, items={}, is_active=False)
+    recent = Cart(items={})
+    session.add_all([*anonymous, owned, checked_out, recent])
+    await session.commit()
+    idle = [cart.id for cart in [*anonymous, owned, checked_out, recent]]
+    await session.execute(
+        update(Cart)
+        .where(Cart.id.in_(idle))
+        .values(last_activity_at=func.now() - datetime.timedelta(days=31))
+    )
+    await session.commit()
+    # Any change counts as activity.
+    response = await client.post(
+        f"/carts/{recent.id}/items/",
+        json={"product_id": str(product.id), "quantity": 1},
+        headers=if_match(recent),
+    )
+    assert response.status_code == 200
+
+    assert await sweep_expired_carts(session, 30, batch_size=2) == 4
+    result = await session.execute(select(Cart.id).order_by(Cart.id))
+    assert result.scalars().all() == [owned.id, recent.id]
+
+
+@pytest.mark.asyncio
+async def test_get_cart_summary(
+    client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    first = await create_product("First", category, price="10")
+    second = await create_product("Second", category, price="2.50")
+    cart.items = {str(first.id): 2, str(second.id): 3, str(uuid.uuid4()): 1}
+    await session.commit()
+
+    response = await client.get(f"/carts/{cart.id}/summary")
+    assert response.status_code == 200
+    assert response.json() == {
+        "subtotal": "27.50",
+        "grand_total": "27.50",
+        "total_items_count": 5,
+    }
+    full = await client.get(f"/carts/{cart.id}")
+    assert full.json()["summary"]["total_items_count"] == 5
+
+    cart.items = {}
+    await session.commit()
+    response = await client.get(f"/carts/{cart.id}/summary")
+    assert response.json()["total_items_count"] == 0
+    response = await client.get("/carts/0/summary")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_merge_cart_into_user_cart(
+    auth_client: AsyncClient,
+    cart: Cart,
+    super_user: User,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    shared = await create_product("Shared", category, stock=5)
+    own = await create_product("Own", category)
+    anonymous = await create_product("Anonymous", category)
+    user_cart = Cart(
+        user_id=super_user.id, items={str(shared.id): 2, str(own.id): 1}
+    )
+    session.add(user_cart)
+    cart.items = {
+        str(shared.id): 4,
+        str(anonymous.id): 3,
+        str(uuid.uuid4()): 1,
+    }
+    await session.commit()
+
+    response = await auth_client.post(
+        f"/carts/{cart.id}/merge", headers=cart_token(cart)
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == user_cart.id
+    quantities = {
+        item["product_id"]: item["quantity"] for item in data["items"]
+    }
+    assert quantities == {
+        str(shared.id): 5,
+        str(own.id): 1,
+        str(anonymous.id): 3,
+    }
+    await session.refresh(cart)
+    assert not cart.is_active
+    # Merging again fails: the anonymous cart is gone.
+    response = await auth_client.post(
+        f"/carts/{cart.id}/merge", headers=cart_token(cart)
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_merge_cart_requires_its_token(
+    auth_client: AsyncClient, cart: Cart, session: AsyncSession
+):
+    other = Cart(items={})
+    session.add(other)
+    await session.commit()
+    attempts = [
+        ({}, 422),
+        (cart_token(other), 403),
+        ({"X-Cart-Token": "guess"}, 403),
+    ]
+    for headers, status_code in attempts:
+        response = await auth_client.post(
+            f"/carts/{cart.id}/merge", headers=headers
+        )
+        assert response.status_code == status_code
+    await session.refresh(cart)
+    assert cart.user_id is None
+
+
+@pytest.mark.asyncio
+async def test_merge_cart_without_user_cart_adopts_it(
+    auth_client: AsyncClient,
+    client: AsyncClient,
+    cart: Cart,
+    super_user: User,
+    user: User,
+    product: Product,
+    session: AsyncSession,
+):
+    cart.items = {str(product.id): 2}
+    await session.commit()
+    response = await auth_client.post(
+        f"/carts/{cart.id}/merge", headers=cart_token(cart)
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == cart.id
+    assert response.json()["version"] == 2
+    assert cart.user_id == super_user.id
+    # Retrying returns the user's cart as it is.
+    response = await auth_client.post(
+        f"/carts/{cart.id}/merge", headers=cart_token(cart)
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+    other = Cart(user_id=user.id, items={})
+    session.add(other)
+    await session.commit()
+    response = await auth_client.post(
+        f"/carts/{other.id}/merge", headers=cart_token(other)
+    )
+    assert response.status_code == 404
+    del client.headers["Authorization"]
+    response = await client.post(
+        f"/carts/{cart.id}/merge", headers=cart_token(cart)
+    )
+    assert response.status_code == 401
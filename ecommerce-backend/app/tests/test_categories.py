@@ -11,3 +11,49 @@ async def test_get_all_categories(client: AsyncClient, category: Category):
     data = response.json()[0]
     assert data["name"] == category.name
     assert data["id"] == str(category.id)
+
+
+@pytest.mark.asyncio
+async def test_get_all_categories_etag(client: AsyncClient, category: Category):
+    response = await client.get("/categories/")
+    etag = response.headers["etag"]
+    response = await client.get("/categories/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await client.get(
+        "/categories/", headers={"If-None-Match": '"stale"'}
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == category.name
+
+
+@pytest.mark.asyncio
+async def test_get_all_categories_product_counts(
+    auth_client: AsyncClient, create_category, create_product
+):
+    books = await create_category("Count Books")
+    empty = await create_category("Count Empty")
+    await create_product("Novel", books)
+    await create_product("Poems", books)
+
+    response = await auth_client.get("/categories/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60"
+    counts = {c["id"]: c["product_count"] for c in response.json()}
+    assert counts[str(books.id)] == 2
+    assert counts[str(empty.id)] == 0
+
+    response = await auth_client.post(
+        "/products/",
+        json={
+            "name": "Essays",
+            "description": "A book",
+            "image_url": "http://example.com/image.png",
+            "price": 12,
+            "stock": 1,
+            "category_id": str(empty.id),
+        },
+    )
+    assert response.status_code == 201
+    response = await auth_client.get("/categories/")
+    counts = {c["id"]: c["product_count"] for c in response.json()}
+    assert counts[str(empty.id)] == 1
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.db import DATABASE_URL
+from app.invalidation import (
+    MAX_PAYLOAD_SIZE,
+    InvalidationListener,
+    apply_invalidation,
+    publish_invalidation,
+)
+
+
+async def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.02)
+    return condition()
+
+
+def test_apply_invalidation():
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    cache.set(("product", "1"), b"1")
+    cache.set(("product", "2"), b"2")
+    cache.set(("products", "{}"), b"[]")
+    apply_invalidation(
+        json.dumps({"keys": [["product", "1"]], "namespaces": ["products"]}),
+        cache,
+    )
+    assert cache.get(("product", "1")) is None
+    assert cache.get(("product", "2")) == b"2"
+    assert cache.get(("products", "{}")) is None
+
+
+@pytest.mark.asyncio
+async def test_publish_invalidation_falls_back_to_namespaces(
+    session: AsyncSession,
+):
+    keys = [("product", str(i) * 40) for i in range(500)]
+    payload = await publish_invalidation(
+        session, keys=keys, namespaces=["products"]
+    )
+    await session.rollback()
+    assert len(payload) < MAX_PAYLOAD_SIZE
+    assert json.loads(payload) == {
+        "keys": [],
+        "namespaces": ["product", "products"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_listener_evicts_on_commit(session: AsyncSession):
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    cache.set(("product", "1"), b"1")
+    listener = InvalidationListener(DATABASE_URL, cache)
+    await listener.start()
+    try:
+        await publish_invalidation(session, keys=[("product", "1")])
+        await asyncio.sleep(0.1)
+        assert cache.get(("product", "1")) == b"1"
+        await session.commit()
+        assert await wait_for(lambda: cache.stats()["size"] == 0)
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_listener_ignores_rolled_back_writes(session: AsyncSession):
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    cache.set(("product", "1"), b"1")
+    listener = InvalidationListener(DATABASE_URL, cache)
+    await listener.start()
+    try:
+        await publish_invalidation(session, keys=[("product", "1")])
+        await session.rollback()
+        await asyncio.sleep(0.2)
+        assert cache.get(("product", "1")) == b"1"
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnects(session: AsyncSession):
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    listener = InvalidationListener(DATABASE_URL, cache, reconnect_delay=0.05)
+    await listener.start()
+    try:
+        cache.set(("product", "1"), b"1")
+        await session.execute(
+            select(
+                func.pg_terminate_backend(listener._connection.get_server_pid())
+            )
+        )
+        await session.commit()
+        assert await wait_for(lambda: cache.stats()["size"] == 0)
+        assert await wait_for(lambda: listener._reconnect_task is None)
+        assert listener._connection is not None
+
+        cache.set(("product", "2"), b"2")
+        await publish_invalidation(session, keys=[("product", "2")])
+        await session.commit()
+        assert await wait_for(lambda: cache.stats()["size"] == 0)
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_listener_starts_in_background_without_database():
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    listener = InvalidationListener(
+        "postgresql://postgres@127.0.0.1:1/app", cache, reconnect_delay=0.05
+    )
+    listener.start_in_background()
+    try:
+        await asyncio.sleep(0.2)
+        assert listener._connection is None
+        assert listener._reconnect_task is not None
+        assert not listener._reconnect_task.done()
+    finally:
+        await listener.stop()
+    assert listener._reconnect_task is None
+
+
+@pytest.mark.asyncio
+async def test_listener_starts_in_background(session: AsyncSession):
+    cache: TTLCache[bytes] = TTLCache(max_size=10, ttl=60)
+    listener = InvalidationListener(DATABASE_URL, cache)
+    listener.start_in_background()
+    try:
+        assert await wait_for(lambda: listener._reconnect_task is None)
+        cache.set(("product", "1"), b"1")
+        await publish_invalidation(session, keys=[("product", "1")])
+        await session.commit()
+        assert await wait_for(lambda: cache.stats()["size"] == 0)
+    finally:
+        await listener.stop()
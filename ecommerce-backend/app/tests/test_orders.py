@@ -1,10 +1,20 @@
+import asyncio
+
 import pytest
 from faker import Faker
+from fastapi import HTTPException
 from httpx import AsyncClient
+from sqlalchemy import event, func, select
 from sqlalchemy.ext.asyncio.session import AsyncSession
 
+from app.cart_store.sql import SqlCartStore
 from app.db import Cart, Order, OrderItem, Product, User
-from app.schemas import OrderRead, OrderReadWithUser
+from app.schemas import OrderCreate, OrderRead, OrderReadWithUser
+from app.services.orders import OrderService
+
+
+def if_match(cart: Cart) -> dict[str, str]:
+    return {"If-Match": f'"{cart.version}"'}
 
 
 @pytest.mark.asyncio
@@ -16,7 +26,9 @@ async def test_create_order(
     super_user: User,
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 12}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 12}},
+        headers=if_match(cart),
     )
     initial_product_stock = product.stock
     assert response.status_code == 200
@@ -60,7 +72,9 @@ async def test_create_order_cart_empty(
     assert response.status_code == 400
     assert response.json() == {"detail": "Cart is empty"}
     cart.items = {str(product.id): 0}
-    await auth_client.put(f"/carts/{cart.id}", json={"items": cart.items})
+    await auth_client.put(
+        f"/carts/{cart.id}", json={"items": cart.items}, headers=if_match(cart)
+    )
 
     response = await auth_client.post(
         f"/carts/{cart.id}/orders/",
@@ -77,7 +91,9 @@ async def test_create_order_empty_shipping_address(
     cart: Cart,
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 1}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 1}},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     response = await auth_client.post(
@@ -99,7 +115,9 @@ async def test_create_order_too_long_shipping_address(
     faker: Faker,
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 1}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 1}},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     response = await auth_client.post(
@@ -120,7 +138,9 @@ async def test_create_order_invalid_quantity(
     cart: Cart,
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): -1}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): -1}},
+        headers=if_match(cart),
     )
     assert response.status_code == 422
     assert (
@@ -138,6 +158,7 @@ async def test_create_order_too_many_items(
     response = await auth_client.put(
         f"/carts/{cart.id}",
         json={"items": {str(product.id): product.stock + 2}},
+        headers=if_match(cart),
     )
     assert response.status_code == 400
     assert (
@@ -146,6 +167,194 @@ async def test_create_order_too_many_items(
     )
 
 
+@pytest.mark.asyncio
+async def test_create_order_stock_shortfall_changes_nothing(
+    auth_client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    available = await create_product("Available", category, stock=10)
+    scarce = await create_product("Scarce", category, stock=10)
+    response = await auth_client.put(
+        f"/carts/{cart.id}",
+        json={"items": {str(available.id): 2, str(scarce.id): 3}},
+        headers=if_match(cart),
+    )
+    assert response.status_code == 200
+    # Someone else buys most of the stock after it was added to the cart.
+    scarce.stock = 2
+    await session.commit()
+
+    response = await auth_client.post(
+        f"/carts/{cart.id}/orders/",
+        json={"shipping_address": "123 Main St, Anytown, USA"},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Not enough stock for product Scarce"}
+    await session.refresh(available)
+    await session.refresh(cart)
+    assert available.stock == 10
+    assert cart.is_active
+    assert (await session.execute(select(Order))).scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checkouts_never_oversell(
+    super_user: User,
+    create_product,
+    category,
+    session: AsyncSession,
+    session_maker,
+):
+    product = await create_product("Product", category, stock=5)
+    carts = [Cart(items={str(product.id): 3}) for _ in range(3)]
+    session.add_all(carts)
+    await session.commit()
+
+    async def check_out(cart_id: int) -> int:
+        async with session_maker() as other:
+            user = await other.get(User, super_user.id)
+            try:
+                await OrderService.create_order(
+                    other,
+                    SqlCartStore(other),
+                    OrderCreate(shipping_address="123 Main St"),
+                    cart_id,
+                    user,
+                )
+            except HTTPException as exc:
+                return exc.status_code
+            return 201
+
+    statuses = await asyncio.gather(*(check_out(cart.id) for cart in carts))
+    assert sorted(statuses) == [201, 400, 400]
+    await session.refresh(product)
+    assert product.stock == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checkouts_of_one_cart_create_one_order(
+    super_user: User,
+    cart: Cart,
+    product: Product,
+    session: AsyncSession,
+    session_maker,
+):
+    cart.items = {str(product.id): 2}
+    await session.commit()
+    stale = await SqlCartStore(session).get(cart.id)
+
+    async def check_out() -> int:
+        async with session_maker() as other:
+            user = await other.get(User, super_user.id)
+            try:
+                await OrderService.create_order(
+                    other,
+                    SqlCartStore(other),
+                    OrderCreate(shipping_address="123 Main St"),
+                    cart.id,
+                    user,
+                )
+            except HTTPException as exc:
+                return exc.status_code
+            return 201
+
+    statuses = await asyncio.gather(check_out(), check_out())
+    assert statuses.count(201) == 1
+    # A checkout that read the cart before the other one committed is
+    # turned away when it claims the cart.
+    async with session_maker() as other:
+        assert not await SqlCartStore(other).check_out(other, stale)
+    result = await session.execute(select(func.count()).select_from(Order))
+    assert result.scalar() == 1
+    await session.refresh(product)
+    assert product.stock == 98
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checkouts_of_shared_products(
+    super_user: User,
+    create_product,
+    category,
+    session: AsyncSession,
+    session_maker,
+):
+    products = [
+        await create_product(f"Product {i}", category, stock=10)
+        for i in range(4)
+    ]
+    carts = [
+        Cart(
+            items={
+                str(product.id): 1 for product in products[i:] + products[:i]
+            }
+        )
+        for i in range(len(products))
+    ]
+    session.add_all(carts)
+    await session.commit()
+
+    async def check_out(cart_id: int) -> None:
+        async with session_maker() as other:
+            user = await other.get(User, super_user.id)
+            await OrderService.create_order(
+                other,
+                SqlCartStore(other),
+                OrderCreate(shipping_address="123 Main St"),
+                cart_id,
+                user,
+            )
+
+    await asyncio.gather(*(check_out(cart.id) for cart in carts))
+    for product in products:
+        await session.refresh(product)
+        assert product.stock == 6
+
+
+@pytest.mark.asyncio
+async def test_create_order_writes_items_at_once_without_reload(
+    auth_client: AsyncClient,
+    cart: Cart,
+    create_product,
+    category,
+    session: AsyncSession,
+):
+    first = await create_product("First", category)
+    second = await create_product("Second", category)
+    cart.items = {str(first.id): 1, str(second.id): 2}
+    await session.commit()
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = await auth_client.post(
+            f"/carts/{cart.id}/orders/",
+            json={"shipping_address": "123 Main St, Anytown, USA"},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 201
+    data = response.json()
+    assert {item["product"]["name"] for item in data["order_items"]} == {
+        "First",
+        "Second",
+    }
+    assert data["total_price"] == str(first.price * 3)
+    inserts = [s for s in statements if "INSERT INTO" in s]
+    assert len(inserts) == 1
+    assert "INSERT INTO orders" in inserts[0]
+    assert "INSERT INTO order_items" in inserts[0]
+    assert not [s for s in statements if "FROM orders" in s]
+    response = await auth_client.get(f"/orders/{data['id']}")
+    assert response.json()["order_items"] == data["order_items"]
+
+
 @pytest.mark.asyncio
 async def test_count_orders_superuser(auth_client: AsyncClient):
     response = await auth_client.get("/orders/count")
@@ -218,7 +427,9 @@ async def test_get_all_orders_order_schema_validation(
     cart: Cart,
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 5}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 5}},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     response = await auth_client.post(
@@ -243,7 +454,9 @@ async def test_get_order(
     auth_client: AsyncClient, product: Product, cart: Cart
 ):
     response = await auth_client.put(
-        f"/carts/{cart.id}", json={"items": {str(product.id): 5}}
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 5}},
+        headers=if_match(cart),
     )
     assert response.status_code == 200
     response = await auth_client.post(
@@ -260,3 +473,52 @@ async def test_get_order(
 async def test_get_order_unauthorized(client: AsyncClient):
     response = await client.get("/orders/1")
     assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_create_order_invalidates_product_cache(
+    auth_client: AsyncClient,
+    product: Product,
+    cart: Cart,
+):
+    response = await auth_client.get(f"/products/{product.id}")
+    initial_stock = response.json()["stock"]
+    await auth_client.put(
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 2}},
+        headers=if_match(cart),
+    )
+    response = await auth_client.post(
+        f"/carts/{cart.id}/orders/",
+        json={"shipping_address": "123 Main St, Anytown, USA"},
+    )
+    assert response.status_code == 201
+    response = await auth_client.get(f"/products/{product.id}")
+    assert response.json()["stock"] == initial_stock - 2
+
+
+@pytest.mark.asyncio
+async def test_read_orders_sparse_fields(
+    auth_client: AsyncClient, product: Product, cart: Cart
+):
+    await auth_client.put(
+        f"/carts/{cart.id}",
+        json={"items": {str(product.id): 1}},
+        headers=if_match(cart),
+    )
+    response = await auth_client.post(
+        f"/carts/{cart.id}/orders/",
+        json={"shipping_address": "123 Main St, Anytown, USA"},
+    )
+    order_id = response.json()["id"]
+    response = await auth_client.get("/orders/?fields=id,status,user")
+    assert response.status_code == 200
+    order = next(o for o in response.json() if o["id"] == order_id)
+    assert set(order) == {"id", "status", "user"}
+    response = await auth_client.get("/orders/user?fields=id,order_items")
+    assert response.status_code == 200
+    order = next(o for o in response.json() if o["id"] == order_id)
+    assert set(order) == {"id", "order_items"}
+    assert order["order_items"][0]["product_id"] == str(product.id)
+    response = await auth_client.get("/orders/user?fields=user")
+    assert response.status_code == 422
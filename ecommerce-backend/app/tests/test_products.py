@@ -1,11 +1,16 @@
+import base64
+import json
 import uuid
 from typing import Callable, Coroutine
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import app.routers.products
+from app.cache import catalog_cache
 from app.db import Category, Product
+from app.services.products import ProductsService
 
 
 @pytest.mark.asyncio
@@ -322,3 +327,809 @@ async def test_get_low_stock_products_count_unauthorized(client: AsyncClient):
     response = await client.get("/products/low-stock/count")
     assert response.status_code == 401
     assert response.json()["detail"] == "Unauthorized"
+
+
+@pytest.mark.asyncio
+async def test_get_low_stock_products_count_category_threshold(
+    auth_client: AsyncClient,
+    create_product,
+    create_category,
+    session: AsyncSession,
+):
+    strict = await create_category("Strict")
+    strict.low_stock_threshold = 60
+    await session.commit()
+    product = await create_product("Product 1", stock=50, category=strict)
+    await create_product("Product 2", stock=20, category=strict)
+    response = await auth_client.get("/products/low-stock/count")
+    assert response.json()["count"] == 2
+
+    response = await auth_client.patch(
+        f"/products/{product.id}", json={"stock": 80}
+    )
+    assert response.status_code == 200
+    response = await auth_client.get("/products/low-stock/count")
+    assert response.json()["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_low_stock_products(
+    auth_client: AsyncClient,
+    create_product,
+    create_category,
+    category: Category,
+    session: AsyncSession,
+):
+    loose = await create_category("Loose")
+    loose.low_stock_threshold = 5
+    await session.commit()
+    await create_product("Fine", stock=100, category=category)
+    await create_product("Loose fine", stock=10, category=loose)
+    low = [
+        await create_product(f"Low {stock}", stock=stock, category=category)
+        for stock in (25, 0, 12)
+    ]
+    low.append(await create_product("Loose low", stock=3, category=loose))
+    expected = sorted(low, key=lambda p: (p.stock, str(p.id)))
+
+    response = await auth_client.get("/products/low-stock?limit=3")
+    assert response.status_code == 200
+    page = response.json()
+    assert [p["id"] for p in page["items"]] == [str(p.id) for p in expected[:3]]
+    response = await auth_client.get(
+        f"/products/low-stock?limit=3&cursor={page['next_cursor']}"
+    )
+    page = response.json()
+    assert [p["id"] for p in page["items"]] == [str(expected[3].id)]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_read_low_stock_products_unauthorized(client: AsyncClient):
+    response = await client.get("/products/low-stock")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_read_products_page(
+    client: AsyncClient,
+    create_product,
+    category: Category,
+):
+    for i in range(3):
+        await create_product(f"Product {i}", category=category)
+    response = await client.get("/products/page", params={"limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data["items"]] == ["Product 0", "Product 1"]
+    assert data["items"][0]["category"]["id"] == str(category.id)
+    assert data["next_cursor"] is not None
+
+    response = await client.get(
+        "/products/page", params={"limit": 2, "cursor": data["next_cursor"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data["items"]] == ["Product 2"]
+    assert data["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_read_products_page_same_created_at(
+    client: AsyncClient,
+    session: AsyncSession,
+    category: Category,
+):
+    session.add_all(
+        Product(
+            name=f"Product {i}",
+            description="A test product",
+            image_url="http://example.com/image.png",
+            price=10.99,
+            stock=100,
+            category_id=category.id,
+        )
+        for i in range(5)
+    )
+    await session.commit()
+    seen: list[str] = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/products/page", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(p["id"] for p in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+@pytest.mark.asyncio
+async def test_read_products_page_invalid_cursor(client: AsyncClient):
+    response = await client.get("/products/page", params={"cursor": "bogus"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+    crafted = [
+        [None, ["2020-01-01T00:00:00", 5]],
+        [None, ["2020-01-01T00:00:00+02:00", str(uuid.uuid4())]],
+        [None, {"a": 1}],
+        "not a pair",
+    ]
+    for payload in crafted:
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode())
+        response = await client.get(
+            "/products/page", params={"cursor": cursor.decode()}
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_products_page_invalid_limit(client: AsyncClient):
+    response = await client.get("/products/page", params={"limit": 0})
+    assert response.status_code == 422
+    response = await client.get("/products/page", params={"limit": 100000})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_search_products(
+    client: AsyncClient,
+    session: AsyncSession,
+    category: Category,
+):
+    session.add_all(
+        [
+            Product(
+                name="Wireless Headphones",
+                description="Bluetooth over-ear headphones",
+                image_url="http://example.com/image.png",
+                price=99.99,
+                stock=10,
+                category_id=category.id,
+            ),
+            Product(
+                name="Phone Case",
+                description="Works great with wireless headphones",
+                image_url="http://example.com/image.png",
+                price=9.99,
+                stock=10,
+                category_id=category.id,
+            ),
+            Product(
+                name="Science Fiction Novel",
+                description="A thrilling sci-fi adventure",
+                image_url="http://example.com/image.png",
+                price=15.50,
+                stock=10,
+                category_id=category.id,
+            ),
+        ]
+    )
+    await session.commit()
+    response = await client.get("/products/search", params={"q": "headphones"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data] == ["Wireless Headphones", "Phone Case"]
+    assert data[0]["category"]["id"] == str(category.id)
+
+    response = await client.get(
+        "/products/search", params={"q": "headphones", "limit": 1}
+    )
+    assert [p["name"] for p in response.json()] == ["Wireless Headphones"]
+
+    response = await client.get("/products/search", params={"q": "laptop"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_products_fallback(
+    session: AsyncSession, create_product, category: Category
+):
+    await create_product("Blue Shirt", category=category)
+    await create_product("Red Shirt", category=category)
+    await create_product("Blue Mug", category=category)
+    products = await ProductsService._search_products_fallback(
+        session, "blue shirt", 10
+    )
+    assert [p.name for p in products][0] == "Blue Shirt"
+    assert {p.name for p in products} == {"Blue Shirt", "Red Shirt", "Blue Mug"}
+    products = await ProductsService._search_products_fallback(
+        session, "blue shirt", 1
+    )
+    assert [p.name for p in products] == ["Blue Shirt"]
+    # Underscores are matched literally, not as LIKE wildcards.
+    products = await ProductsService._search_products_fallback(
+        session, "blue_", 10
+    )
+    assert products == []
+
+
+@pytest.mark.asyncio
+async def test_search_products_requires_query(client: AsyncClient):
+    response = await client.get("/products/search")
+    assert response.status_code == 422
+    response = await client.get("/products/search", params={"q": ""})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_suggest_products(
+    client: AsyncClient, create_product, category: Category
+):
+    headphones = await create_product("Wireless Headphones", category=category)
+    await create_product("Headphone Stand", category=category)
+    await create_product("Science Fiction Novel", category=category)
+    response = await client.get("/products/suggest", params={"q": "head"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data] == [
+        "Headphone Stand",
+        "Wireless Headphones",
+    ]
+    assert data[1] == {"id": str(headphones.id), "name": "Wireless Headphones"}
+
+
+@pytest.mark.asyncio
+async def test_suggest_products_fuzzy(
+    client: AsyncClient, create_product, category: Category
+):
+    await create_product("Wireless Headphones", category=category)
+    response = await client.get("/products/suggest", params={"q": "headphnes"})
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Wireless Headphones"]
+
+
+@pytest.mark.asyncio
+async def test_suggest_products_limit(
+    client: AsyncClient, create_product, category: Category
+):
+    for i in range(3):
+        await create_product(f"Shirt {i}", category=category)
+    response = await client.get(
+        "/products/suggest", params={"q": "shirt", "limit": 2}
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    response = await client.get(
+        "/products/suggest", params={"q": "shirt", "limit": 50}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_suggest_products_escapes_wildcards(
+    client: AsyncClient, create_product, category: Category
+):
+    await create_product("Shirt", category=category)
+    response = await client.get("/products/suggest", params={"q": "%"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_read_products_filtered(
+    client: AsyncClient,
+    create_product,
+    create_category: Callable[[str], Coroutine[None, None, Category]],
+):
+    books = await create_category("Books")
+    games = await create_category("Games")
+    await create_product("Cheap Book", category=books, price="5.00")
+    await create_product("Rare Book", category=books, price="80.00", stock=0)
+    await create_product("Mid Book", category=books, price="20.00")
+    await create_product("Board Game", category=games, price="30.00")
+
+    response = await client.get(
+        "/products/",
+        params={"category_id": str(books.id), "sort": "price_desc"},
+    )
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == [
+        "Rare Book",
+        "Mid Book",
+        "Cheap Book",
+    ]
+
+    response = await client.get(
+        "/products/",
+        params={
+            "category_id": str(books.id),
+            "in_stock": True,
+            "min_price": "10",
+            "max_price": "100",
+        },
+    )
+    assert [p["name"] for p in response.json()] == ["Mid Book"]
+
+    response = await client.get("/products/", params={"sort": "newest"})
+    assert response.json()[0]["name"] == "Board Game"
+
+
+@pytest.mark.asyncio
+async def test_read_products_invalid_price_range(client: AsyncClient):
+    response = await client.get(
+        "/products/", params={"min_price": "10", "max_price": "5"}
+    )
+    assert response.status_code == 422
+    response = await client.get("/products/", params={"sort": "name"})
+    assert response.status_code == 422
+    for path in ("/products/", "/products/page", "/products/facets"):
+        for params in ({"min_price": "1e30"}, {"max_price": "0.001"}):
+            response = await client.get(path, params=params)
+            assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_read_products_page_sorted_by_price(
+    client: AsyncClient, create_product, category: Category
+):
+    for price in ["30.00", "10.00", "20.00", "10.00"]:
+        await create_product(f"Product {price}", category=category, price=price)
+    prices: list[str] = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"limit": 3, "sort": "price_asc"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/products/page", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        prices.extend(p["price"] for p in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert prices == ["10.00", "10.00", "20.00", "30.00"]
+
+
+@pytest.mark.asyncio
+async def test_read_products_page_cursor_sort_mismatch(
+    client: AsyncClient, create_product, category: Category
+):
+    await create_product("Product 1", category=category)
+    await create_product("Product 2", category=category)
+    response = await client.get(
+        "/products/page", params={"limit": 1, "sort": "newest"}
+    )
+    cursor = response.json()["next_cursor"]
+    response = await client.get(
+        "/products/page",
+        params={"limit": 1, "sort": "price_asc", "cursor": cursor},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+    for price in ("123456789012", "NaN", "Infinity"):
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(["price_asc", [price, str(uuid.uuid4())]]).encode()
+        ).decode()
+        response = await client.get(
+            "/products/page", params={"sort": "price_asc", "cursor": cursor}
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_product_etag(auth_client: AsyncClient, product: Product):
+    response = await auth_client.get(f"/products/{product.id}")
+    etag = response.headers["etag"]
+    assert etag.startswith('"')
+
+    response = await auth_client.get(
+        f"/products/{product.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    await auth_client.patch(f"/products/{product.id}", json={"stock": 1})
+    response = await auth_client.get(
+        f"/products/{product.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["stock"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_products_etag(client: AsyncClient, product: Product):
+    response = await client.get("/products/")
+    etag = response.headers["etag"]
+    response = await client.get(
+        "/products/", headers={"If-None-Match": f'"other", W/{etag}'}
+    )
+    assert response.status_code == 304
+    response = await client.get(
+        "/products/",
+        params={"min_price": "1000"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_import_products_csv(
+    auth_client: AsyncClient,
+    session: AsyncSession,
+    category: Category,
+    create_product,
+):
+    existing = await create_product("Old Name", category=category)
+    existing.sku = "SKU-1"
+    await session.commit()
+    feed = (
+        "sku,name,description,image_url,price,stock,category\n"
+        f"SKU-1,New Name,Updated,http://example.com/1.png,12.50,5,{category.name}\n"
+        f"SKU-2,Second,Desc,http://example.com/2.png,3.00,7,{category.name}\n"
+        "SKU-3,Third,Desc,http://example.com/3.png,-1,7,Test Category\n"
+        "SKU-4,Fourth,Desc,http://example.com/4.png,1.00,1,Missing\n"
+        f"SKU-2,Second v2,Desc,http://example.com/2.png,4.00,8,{category.name}\n"
+        "SKU-5,Fifth,Desc,http://example.com/5.png,123456789012.00,1,"
+        f"{category.name}\n"
+        "SKU-6,Sixth,Desc,http://example.com/6.png,1.00,99999999999,"
+        f"{category.name}\n"
+    )
+    response = await auth_client.post(
+        "/products/import",
+        files={"file": ("feed.csv", feed.encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 1
+    assert data["updated"] == 1
+    assert data["rejected"] == 4
+    assert [e["line"] for e in data["errors"]] == [4, 5, 7, 8]
+    assert data["errors"][0]["message"].startswith("price:")
+    assert data["errors"][1]["message"] == "Unknown category 'Missing'"
+    assert data["errors"][2]["message"].startswith("price:")
+    assert data["errors"][3]["message"].startswith("stock:")
+
+    await session.refresh(existing)
+    assert existing.name == "New Name"
+    assert existing.stock == 5
+    response = await auth_client.get("/products/", params={"sort": "price_asc"})
+    products = {p["sku"]: p for p in response.json()}
+    assert products["SKU-2"]["name"] == "Second v2"
+    assert products["SKU-2"]["price"] == "4.00"
+
+
+@pytest.mark.asyncio
+async def test_import_products_ndjson(
+    auth_client: AsyncClient, category: Category
+):
+    rows = [
+        {
+            "sku": f"SKU-{i}",
+            "name": f"Product {i}",
+            "description": "Desc",
+            "image_url": "http://example.com/image.png",
+            "price": "9.99",
+            "stock": i,
+            "category": category.name,
+        }
+        for i in range(3)
+    ]
+    feed = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n[]\n"
+    response = await auth_client.post(
+        "/products/import",
+        files={"file": ("feed.ndjson", feed.encode(), "application/x-ndjson")},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 3
+    assert data["errors"] == [
+        {"line": 4, "message": "Invalid JSON"},
+        {"line": 5, "message": "Expected a JSON object"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_products_unsupported_format(auth_client: AsyncClient):
+    response = await auth_client.post(
+        "/products/import",
+        files={"file": ("feed.xlsx", b"", "application/octet-stream")},
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_import_products_unauthorized(client: AsyncClient):
+    response = await client.post(
+        "/products/import",
+        files={"file": ("feed.csv", b"", "text/csv")},
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_create_product_duplicate_sku(
+    auth_client: AsyncClient, category: Category
+):
+    product = {
+        "sku": "SKU-1",
+        "name": "Test Product",
+        "description": "A test product",
+        "image_url": "http://example.com/image.png",
+        "price": 10.99,
+        "stock": 100,
+        "category_id": str(category.id),
+    }
+    response = await auth_client.post("/products/", json=product)
+    assert response.status_code == 201
+    assert response.json()["sku"] == "SKU-1"
+    response = await auth_client.post("/products/", json=product)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "SKU already exists"
+
+
+@pytest.mark.asyncio
+async def test_export_products_ndjson(
+    auth_client: AsyncClient, create_product, category: Category
+):
+    first = await create_product("Product 1", category=category)
+    await create_product("Product 2", category=category, price="5.50")
+    response = await auth_client.get("/products/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["name"] for row in rows] == ["Product 1", "Product 2"]
+    assert rows[0]["id"] == str(first.id)
+    assert rows[0]["category"] == category.name
+    assert rows[1]["price"] == "5.50"
+
+
+@pytest.mark.asyncio
+async def test_export_products_csv_round_trips(
+    auth_client: AsyncClient,
+    session: AsyncSession,
+    create_product,
+    category: Category,
+):
+    product = await create_product("Product, with comma", category=category)
+    product.sku = "SKU-1"
+    await session.commit()
+    response = await auth_client.get(
+        "/products/export", params={"format": "csv"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "id,sku,name,description,image_url,price,stock,category"
+    assert len(lines) == 2
+
+    response = await auth_client.post(
+        "/products/import",
+        files={"file": ("feed.csv", response.content, "text/csv")},
+    )
+    assert response.json()["updated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_export_products_unauthorized(client: AsyncClient):
+    response = await client.get("/products/export")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_read_products_batch(
+    client: AsyncClient, create_product, category: Category
+):
+    first = await create_product("Product 1", category=category)
+    second = await create_product("Product 2", category=category)
+    await client.get(f"/products/{second.id}")
+    unknown = uuid.uuid4()
+    response = await client.get(
+        "/products/batch",
+        params={"ids": [str(second.id), str(unknown), str(first.id)]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["id"] for p in data["items"]] == [str(second.id), str(first.id)]
+    assert data["items"][1]["category"]["id"] == str(category.id)
+    assert data["missing"] == [str(unknown)]
+
+
+@pytest.mark.asyncio
+async def test_read_products_batch_limits(client: AsyncClient):
+    response = await client.get("/products/batch")
+    assert response.status_code == 422
+    response = await client.get(
+        "/products/batch",
+        params={"ids": [str(uuid.uuid4()) for _ in range(101)]},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_read_products_sparse_fields(
+    client: AsyncClient, product: Product
+):
+    response = await client.get("/products/?fields=id,name,price")
+    assert response.status_code == 200
+    data = response.json()
+    assert data == [
+        {
+            "id": str(product.id),
+            "name": product.name,
+            "price": str(product.price),
+        }
+    ]
+    response = await client.get("/products/?fields=name,category")
+    assert response.json()[0]["category"]["id"] == str(product.category_id)
+    assert set(response.json()[0]) == {"name", "category"}
+
+
+@pytest.mark.asyncio
+async def test_read_products_sparse_fields_invalid(client: AsyncClient):
+    response = await client.get("/products/?fields=id,secret")
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Unknown fields: secret"
+    response = await client.get("/products/?fields=,")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_read_product_facets(
+    client: AsyncClient, create_category, create_product
+):
+    shoes = await create_category("Facet Shoes")
+    hats = await create_category("Facet Hats")
+    await create_product("Cheap shoe", shoes, price="5.00", stock=0)
+    await create_product("Shoe", shoes, price="30.00", stock=3)
+    await create_product("Hat", hats, price="30.00", stock=1)
+
+    response = await client.get("/products/facets")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert data["in_stock"] == 2
+    assert {c["category_id"]: c["count"] for c in data["categories"]} == {
+        str(shoes.id): 2,
+        str(hats.id): 1,
+    }
+    buckets = {b["min_price"]: b["count"] for b in data["price_buckets"]}
+    assert buckets[None] == 1
+    assert buckets["25"] == 2
+    assert data["price_buckets"][-1]["max_price"] is None
+
+    # Each facet ignores its own filter but applies the others.
+    response = await client.get(
+        f"/products/facets?category_id={shoes.id}&in_stock=true"
+    )
+    data = response.json()
+    assert data["total"] == 1
+    assert data["in_stock"] == 1
+    assert {c["category_id"]: c["count"] for c in data["categories"]} == {
+        str(shoes.id): 1,
+        str(hats.id): 1,
+    }
+    buckets = {b["min_price"]: b["count"] for b in data["price_buckets"]}
+    assert buckets[None] == 0
+    assert buckets["25"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_product_facets_invalidated_by_writes(
+    auth_client: AsyncClient, category: Category
+):
+    response = await auth_client.get("/products/facets")
+    total = response.json()["total"]
+    response = await auth_client.post(
+        "/products/",
+        json={
+            "name": "Facet product",
+            "description": "A product",
+            "image_url": "http://example.com/image.png",
+            "price": 12,
+            "stock": 1,
+            "category_id": str(category.id),
+        },
+    )
+    assert response.status_code == 201
+    response = await auth_client.get("/products/facets")
+    assert response.json()["total"] == total + 1
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock(
+    auth_client: AsyncClient,
+    create_product,
+    category: Category,
+    session: AsyncSession,
+):
+    first = await create_product("First", stock=10, category=category)
+    second = await create_product("Second", stock=5, category=category)
+    await auth_client.get(f"/products/{first.id}")
+
+    response = await auth_client.post(
+        "/products/stock",
+        json=[
+            {"product_id": str(first.id), "delta": -3},
+            {"product_id": str(second.id), "absolute": 40},
+            {"product_id": str(first.id), "delta": 5},
+            {"product_id": str(second.id), "delta": -1},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"product_id": str(first.id), "sku": None, "stock": 12},
+        {"product_id": str(second.id), "sku": None, "stock": 39},
+    ]
+    assert catalog_cache.get(("product", str(first.id))) is None
+    await session.refresh(first)
+    assert first.stock == 12
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_is_all_or_nothing(
+    auth_client: AsyncClient,
+    create_product,
+    category: Category,
+    session: AsyncSession,
+):
+    first = await create_product("First", stock=10, category=category)
+    second = await create_product("Second", stock=5, category=category)
+    response = await auth_client.post(
+        "/products/stock",
+        json=[
+            {"product_id": str(first.id), "delta": -3},
+            {"product_id": str(second.id), "delta": -6},
+        ],
+    )
+    assert response.status_code == 409
+    assert str(second.id) in response.json()["detail"]
+    response = await auth_client.post(
+        "/products/stock",
+        json=[
+            {"product_id": str(first.id), "delta": -3},
+            {"product_id": str(uuid.uuid4()), "absolute": 1},
+        ],
+    )
+    assert response.status_code == 422
+    response = await auth_client.post(
+        "/products/stock",
+        json=[
+            {"product_id": str(first.id), "delta": -3},
+            {"product_id": str(second.id), "delta": 2**31 - 1},
+            {"product_id": str(second.id), "delta": 2**31 - 1},
+        ],
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == (
+        f"Stock would exceed the maximum for products: {second.id}"
+    )
+    await session.refresh(first)
+    await session.refresh(second)
+    assert (first.stock, second.stock) == (10, 5)
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_validation(auth_client: AsyncClient, product):
+    response = await auth_client.post(
+        "/products/stock",
+        json=[{"product_id": str(product.id), "delta": 1, "absolute": 2}],
+    )
+    assert response.status_code == 422
+    response = await auth_client.post(
+        "/products/stock",
+        json=[{"product_id": str(product.id), "absolute": -1}],
+    )
+    assert response.status_code == 422
+    for adjustment in ({"delta": 2**31}, {"absolute": 2**31}):
+        response = await auth_client.post(
+            "/products/stock",
+            json=[{"product_id": str(product.id), **adjustment}],
+        )
+        assert response.status_code == 422
+    response = await auth_client.post("/products/stock", json=[])
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_unauthorized(client: AsyncClient):
+    response = await client.post("/products/stock", json=[])
+    assert response.status_code == 401
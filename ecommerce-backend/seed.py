@@ -3,6 +3,7 @@ import asyncio
 from sqlalchemy import select
 
 from app.db import Category, Order, OrderItem, Product, async_session_maker
+from app.invalidation import publish_invalidation
 from app.users import create_user
 
 
@@ -180,6 +181,10 @@ async def seed() -> None:
                         price=product.price * spec["quantity"],
                     )
                 )
+        # Running workers drop their cached catalog once the seed commits.
+        await publish_invalidation(
+            session, namespaces=["product", "products", "categories"]
+        )
         await session.commit()
 
 
@@ -0,0 +1,24 @@
+import asyncio
+
+from app.cart_sweeper import sweep_expired_carts
+from app.config import get_settings
+from app.db import async_session_maker
+
+
+async def sweep() -> int:
+    """Delete expired carts once, e.g. from a cron job."""
+    settings = get_settings()
+    async with async_session_maker() as session:
+        return await sweep_expired_carts(
+            session, settings.cart_expiry_days, settings.cart_sweep_batch_size
+        )
+
+
+if __name__ == "__main__":
+    print("Sweeping expired carts...")
+    try:
+        deleted = asyncio.run(sweep())
+        print(f"Deleted {deleted} expired carts.")
+    except Exception as e:
+        print(f"Sweep failed with error: {e}")
+        raise
@@ -5,6 +5,7 @@ import { get_me, login, register } from '@/services/auth';
 import { z } from 'zod';
 import { registerSchema } from '@/entities/user';
 import { redirect, notFound } from 'next/navigation';
+import { mergeCartAction } from '@/actions/cart';
 
 const loginSchema = z.object({
   email: z.email('Invalid email address'),
@@ -35,6 +36,7 @@ export async function loginAction(prevState: unknown, formData: FormData) {
     path: '/',
     maxAge: 3600, // 1 hour
   });
+  await mergeCartAction(response.data.access_token);
   return { success: true };
 }
 
@@ -80,6 +82,7 @@ export async function registerAction(formData: FormData) {
       path: '/',
       maxAge: 3600, // 1 hour
     });
+    await mergeCartAction(loginResponse.data.access_token);
     return { success: true };
   }
 
@@ -6,10 +6,12 @@ import {
   addItemToCart,
   createCart,
   getCart,
+  getCartSummary,
+  mergeCart,
   removeItemFromCart,
   updateItemInCart,
 } from '@/services/carts';
-import { CART_ID_COOKIE } from '@/entities/cart';
+import { CART_ID_COOKIE, CART_TOKEN_COOKIE } from '@/entities/cart';
 
 export async function getCartAction() {
   const cookieStore = await cookies();
@@ -23,18 +25,56 @@ export async function getCartAction() {
   }
 }
 
+export async function getCartSummaryAction() {
+  const cookieStore = await cookies();
+  const cartIdStr = cookieStore.get(CART_ID_COOKIE)?.value;
+  if (!cartIdStr) return null;
+  try {
+    return await getCartSummary(parseInt(cartIdStr));
+  } catch (error) {
+    console.error('Failed to get cart summary:', error);
+    return null;
+  }
+}
+
+export async function mergeCartAction(token: string) {
+  const cookieStore = await cookies();
+  const cartIdStr = cookieStore.get(CART_ID_COOKIE)?.value;
+  const cartToken = cookieStore.get(CART_TOKEN_COOKIE)?.value;
+  if (!cartIdStr || !cartToken) return;
+  try {
+    const cart = await mergeCart(parseInt(cartIdStr), cartToken, token);
+    cookieStore.set(CART_ID_COOKIE, cart.id.toString(), {
+      path: '/',
+      httpOnly: true,
+      sameSite: 'lax',
+      maxAge: 60 * 60 * 24 * 7, // 1 week
+    });
+    cookieStore.delete(CART_TOKEN_COOKIE);
+  } catch (error) {
+    console.error('Failed to merge cart:', error);
+  }
+}
+
 export async function addToCartAction(productId: string, quantity: number = 1) {
   const cookieStore = await cookies();
   const cartIdStr = cookieStore.get(CART_ID_COOKIE)?.value;
   let cartId: number;
   if (!cartIdStr) {
-    cartId = await createCart();
+    const cart = await createCart();
+    cartId = cart.id;
     cookieStore.set(CART_ID_COOKIE, cartId.toString(), {
       path: '/',
       httpOnly: true,
       sameSite: 'lax',
       maxAge: 60 * 60 * 24 * 7, // 1 week
     });
+    cookieStore.set(CART_TOKEN_COOKIE, cart.token, {
+      path: '/',
+      httpOnly: true,
+      sameSite: 'lax',
+      maxAge: 60 * 60 * 24 * 7, // 1 week
+    });
   } else {
     cartId = parseInt(cartIdStr);
   }
@@ -45,25 +85,33 @@ export async function addToCartAction(productId: string, quantity: number = 1) {
 
 export async function updateCartQuantityAction(
   productId: string,
-  quantity: number
+  quantity: number,
+  version: number
 ) {
   const cookieStore = await cookies();
   const cartIdStr = cookieStore.get(CART_ID_COOKIE)?.value;
   if (!cartIdStr) return;
   const cartId = parseInt(cartIdStr);
-  if (quantity <= 0) {
-    await removeItemFromCart(cartId, productId);
-  } else {
-    await updateItemInCart(cartId, productId, quantity);
+  try {
+    if (quantity <= 0) {
+      await removeItemFromCart(cartId, productId, version);
+    } else {
+      await updateItemInCart(cartId, productId, quantity, version);
+    }
+  } finally {
+    // Re-render even on a conflict, so the page shows the current cart.
+    revalidatePath('/', 'layout');
   }
-  revalidatePath('/', 'layout');
 }
 
-export async function removeFromCartAction(productId: string) {
+export async function removeFromCartAction(productId: string, version: number) {
   const cookieStore = await cookies();
   const cartIdStr = cookieStore.get(CART_ID_COOKIE)?.value;
   if (!cartIdStr) return;
   const cartId = parseInt(cartIdStr);
-  await removeItemFromCart(cartId, productId);
-  revalidatePath('/', 'layout');
+  try {
+    await removeItemFromCart(cartId, productId, version);
+  } finally {
+    revalidatePath('/', 'layout');
+  }
 }
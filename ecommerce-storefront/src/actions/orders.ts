@@ -4,7 +4,7 @@ import { createOrder } from '@/services/orders';
 import { redirect } from 'next/navigation';
 import { z } from 'zod';
 import { cookies } from 'next/headers';
-import { CART_ID_COOKIE } from '@/entities/cart';
+import { CART_ID_COOKIE, CART_TOKEN_COOKIE } from '@/entities/cart';
 import { Order } from '@/entities/order';
 import { ActionResponse } from '@/entities/api';
 
@@ -41,5 +41,6 @@ export async function createOrderAction(
   }
   const cookieStore = await cookies();
   cookieStore.delete(CART_ID_COOKIE);
+  cookieStore.delete(CART_TOKEN_COOKIE);
   redirect(`/store/orders/${result.data?.id}`);
 }
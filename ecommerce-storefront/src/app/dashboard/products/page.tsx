@@ -12,6 +12,7 @@ import {
 import { getProducts } from '@/services/products';
 import Image from 'next/image';
 import { formatPrice } from '@/lib/utils';
+import { Product } from '@/entities/product';
 
 export const metadata = {
   title: 'Products',
@@ -19,7 +20,7 @@ export const metadata = {
 };
 
 interface DataTableProps {
-  data: Awaited<ReturnType<typeof getProducts>>;
+  data: Product[];
 }
 
 function DataTable({ data }: DataTableProps) {
@@ -70,8 +71,13 @@ function DataTable({ data }: DataTableProps) {
   );
 }
 
-export default async function ProductsPage() {
-  const products = await getProducts();
+interface Props {
+  searchParams: Promise<{ cursor?: string }>;
+}
+
+export default async function ProductsPage({ searchParams }: Props) {
+  const { cursor } = await searchParams;
+  const { items: products, next_cursor } = await getProducts(cursor);
   return (
     <div className="w-full mx-auto py-10 px-5">
       <div className="flex items-center justify-between mb-6">
@@ -91,6 +97,13 @@ export default async function ProductsPage() {
       <div className="rounded-md border">
         <DataTable data={products} />
       </div>
+      {next_cursor && (
+        <div className="flex justify-end mt-4">
+          <Button variant="outline" asChild>
+            <Link href={{ query: { cursor: next_cursor } }}>Next page</Link>
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
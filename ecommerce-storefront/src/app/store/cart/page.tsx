@@ -34,7 +34,11 @@ export default async function CartPage() {
       <div className="grid lg:grid-cols-3 gap-8">
         <div className="lg:col-span-2 space-y-4">
           {cart.items.map((item) => (
-            <CartItem key={item.product_id} item={item} />
+            <CartItem
+              key={item.product_id}
+              item={item}
+              cartVersion={cart.version}
+            />
           ))}
         </div>
         <div>
@@ -1,8 +1,15 @@
+import Link from 'next/link';
 import { getProducts } from '@/services/products';
 import { ProductCard } from '@/components/ProductCard';
+import { Button } from '@/components/ui/button';
 
-export default async function ProductsPage() {
-  const products = await getProducts();
+interface Props {
+  searchParams: Promise<{ cursor?: string }>;
+}
+
+export default async function ProductsPage({ searchParams }: Props) {
+  const { cursor } = await searchParams;
+  const { items: products, next_cursor } = await getProducts(cursor);
 
   return (
     <div className="space-y-8">
@@ -26,6 +33,14 @@ export default async function ProductsPage() {
           <p className="text-muted-foreground">No products found.</p>
         </div>
       )}
+
+      {next_cursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" asChild>
+            <Link href={{ query: { cursor: next_cursor } }}>More products</Link>
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
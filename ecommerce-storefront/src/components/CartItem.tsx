@@ -14,20 +14,25 @@ import { CartItem as CartItemType } from '@/services/carts';
 
 interface CartItemProps {
   item: CartItemType;
+  cartVersion: number;
 }
 
-export function CartItem({ item }: CartItemProps) {
+export function CartItem({ item, cartVersion }: CartItemProps) {
   const [isPending, startTransition] = useTransition();
 
   const handle_update_quantity = (new_quantity: number) => {
     startTransition(async () => {
-      await updateCartQuantityAction(item.product_id, new_quantity);
+      await updateCartQuantityAction(
+        item.product_id,
+        new_quantity,
+        cartVersion
+      );
     });
   };
 
   const handle_remove = () => {
     startTransition(async () => {
-      await removeFromCartAction(item.product_id);
+      await removeFromCartAction(item.product_id, cartVersion);
     });
   };
 
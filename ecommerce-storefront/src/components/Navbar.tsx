@@ -2,13 +2,13 @@ import Link from 'next/link';
 import { ShoppingBag, ShoppingCart } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
-import { getCartAction } from '@/actions/cart';
+import { getCartSummaryAction } from '@/actions/cart';
 import { User } from '@/entities/user';
 import { UserMenu } from '@/components/UserMenu';
 
 export async function Navbar({ user }: { user?: User | null }) {
-  const cart = await getCartAction();
-  const totalItems = cart?.summary.total_items_count || 0;
+  const summary = await getCartSummaryAction();
+  const totalItems = summary?.total_items_count || 0;
   return (
     <header className="border-b border-border/40 backdrop-blur-sm sticky top-0 z-50 bg-background/80">
       <div className="container mx-auto px-4 h-16 flex items-center justify-between">
@@ -1 +1,2 @@
 export const CART_ID_COOKIE = 'nexstore_cart_id';
+export const CART_TOKEN_COOKIE = 'nexstore_cart_token';
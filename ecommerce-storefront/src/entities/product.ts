@@ -27,6 +27,12 @@ export const productInsertSchema = productSchema.omit({
 export type Product = z.infer<typeof productSchema>;
 export type ProductInsert = z.infer<typeof productInsertSchema>;
 
+// One page of products; pass next_cursor back to get the following page.
+export interface ProductPage {
+  items: Product[];
+  next_cursor: string | null;
+}
+
 export const defaultProductValues: ProductInsert = {
   name: '',
   description: '',
@@ -26,17 +26,33 @@ export interface Cart {
   user_id: string | null;
   items: CartItem[];
   summary: CartSummary;
+  version: number;
   updated_at: string;
 }
 
-export async function createCart(): Promise<number> {
+// Cart mutations must name the version they were based on; the backend
+// rejects them with 409 if the cart has changed since.
+function ifMatch(version: number) {
+  return { 'If-Match': `"${version}"` };
+}
+
+export interface NewCart {
+  id: number;
+  // Proves the cart is ours when merging it into a user's cart.
+  token: string;
+}
+
+export async function createCart(): Promise<NewCart> {
   const res = await fetchApi('/carts', {
     method: 'POST',
   });
   if (!res.ok) throw new Error('Failed to create cart');
   // The backend returns the ID as a string in the response body
   const cartId = await res.json();
-  return parseInt(cartId);
+  return {
+    id: parseInt(cartId),
+    token: res.headers.get('X-Cart-Token') ?? '',
+  };
 }
 
 export async function getCart(cartId: number): Promise<Cart> {
@@ -45,6 +61,29 @@ export async function getCart(cartId: number): Promise<Cart> {
   return res.json();
 }
 
+export async function getCartSummary(cartId: number): Promise<CartSummary> {
+  const res = await fetchApi(`/carts/${cartId}/summary`);
+  if (!res.ok) throw new Error('Failed to fetch cart summary');
+  return res.json();
+}
+
+// Hands an anonymous cart over to the user the token belongs to and
+// returns the user's cart, whose id may differ.
+export async function mergeCart(
+  cartId: number,
+  cartToken: string,
+  token: string
+): Promise<Cart> {
+  const res = await fetchApi(`/carts/${cartId}/merge`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${token}`, 'X-Cart-Token': cartToken },
+  });
+  if (!res.ok) throw new Error('Failed to merge cart');
+  return res.json();
+}
+
+// Adding is additive, so unlike the other mutations it is not tied to a
+// cart version.
 export async function addItemToCart(
   cartId: number,
   productId: string,
@@ -56,7 +95,7 @@ export async function addItemToCart(
   });
   if (!res.ok) {
     const error = await res.json();
-    if (res.status === 400 || res.status === 404) {
+    if (res.status === 400 || res.status === 404 || res.status === 409) {
       return { message: error.detail };
     }
     return { message: 'Failed to add item to cart' };
@@ -67,10 +106,12 @@ export async function addItemToCart(
 export async function updateItemInCart(
   cartId: number,
   productId: string,
-  quantity: number
+  quantity: number,
+  version: number
 ): Promise<Cart> {
   const res = await fetchApi(`/carts/${cartId}/items/${productId}`, {
     method: 'PUT',
+    headers: ifMatch(version),
     body: JSON.stringify({ quantity }),
   });
   if (!res.ok) throw new Error('Failed to update item in cart');
@@ -79,10 +120,12 @@ export async function updateItemInCart(
 
 export async function removeItemFromCart(
   cartId: number,
-  productId: string
+  productId: string,
+  version: number
 ): Promise<Cart> {
   const res = await fetchApi(`/carts/${cartId}/items/${productId}`, {
     method: 'DELETE',
+    headers: ifMatch(version),
   });
   if (!res.ok) throw new Error('Failed to remove item from cart');
   return res.json();
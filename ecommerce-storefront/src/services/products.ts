@@ -1,8 +1,15 @@
 import { fetchApi } from './api';
-import { Product, ProductInsert } from '@/entities/product';
+import { Product, ProductInsert, ProductPage } from '@/entities/product';
 
-export async function getProducts(): Promise<Product[]> {
-  const response = await fetchApi('/products');
+const PRODUCTS_PAGE_SIZE = 48;
+
+export async function getProducts(
+  cursor?: string,
+  limit: number = PRODUCTS_PAGE_SIZE
+): Promise<ProductPage> {
+  const params = new URLSearchParams({ limit: limit.toString() });
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetchApi(`/products/page?${params}`);
   if (!response.ok) throw new Error('Failed to fetch products');
   return response.json();
 }